@@ -1,10 +1,36 @@
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import mimetypes
 import os
+import queue
 import re
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
 import gradio as gr
 import modelscope_studio.components.antd as antd
 import modelscope_studio.components.base as ms
 import modelscope_studio.components.pro as pro
+import requests
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from groq import Groq
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
 
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 if not GROQ_API_KEY:
@@ -40,6 +66,12 @@ AVAILABLE_MODELS = [
     }
 ]
 
+MAX_CANDIDATES = 4
+CANDIDATE_STRATEGIES = [
+    {"label": "⚡ Stream the fastest", "value": "fastest"},
+    {"label": "✅ First valid result", "value": "first_valid"},
+]
+
 SYSTEM_PROMPT = """You are an expert on frontend design, you will always respond to web design tasks.
 Your task is to create a website according to the user's request using either native HTML or React framework.
 When choosing implementation framework, you should follow these rules:
@@ -181,29 +213,1630 @@ react_imports = {
     "react-dom/": "https://esm.sh/react-dom@^19.0.0/"
 }
 
+REACT_ENTRY = """import Demo from './demo.tsx'
+import "@tailwindcss/browser"
+
+export default Demo
+"""
+
+EDIT_FORMAT = """Describe every change as one or more SEARCH/REPLACE blocks in exactly this format:
+
+<<<<<<< SEARCH
+lines copied exactly from the current file
+=======
+the new lines that replace them
+>>>>>>> REPLACE
+
+Each SEARCH section must match the current file exactly and include just enough lines to be unique.
+Use several small blocks rather than one large block, and do not repeat unchanged code."""
+
+EDIT_BLOCK_PATTERN = re.compile(r'^<{7} SEARCH\n(.*?)^={7}\n(.*?)^>{7} REPLACE', re.MULTILINE | re.DOTALL)
+
+EDIT_INSTRUCTIONS = """[Edit Instruction]
+The user is refining the current file, which is included in their message. Do not rewrite the whole file.
+""" + EDIT_FORMAT + """
+Output only the SEARCH/REPLACE blocks, without code fences or any other text.
+Only rewrite the full file in a single code block if the request changes most of it."""
+
+REPAIR_PROMPT = """You fix broken single-file web artifacts.
+You will receive a code file and a list of problems found by an automated check.
+Fix only the listed problems and change nothing else. Only the libraries available in the
+React environment may be imported: """ + ", ".join(sorted(k for k in react_imports if not k.endswith("/"))) + """.
+""" + EDIT_FORMAT + """
+Output only the SEARCH/REPLACE blocks, without code fences or any other text."""
+
+
+# vendored esm modules: `python app.py vendor` mirrors react_imports from esm.sh into VENDOR_DIR,
+# and the server then serves them from VENDOR_ROUTE so previews do not depend on the CDN
+ESM_ORIGIN = "https://esm.sh"
+VENDOR_DIR = os.environ.get("VENDOR_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "vendor", "esm"))
+VENDOR_ROUTE = "/vendor/esm"
+# public origin used for import map urls; derived from the request when unset
+PUBLIC_URL = os.environ.get("PUBLIC_URL", "").rstrip("/")
+
+# subpaths reached through the "react/" and "react-dom/" prefix entries
+VENDOR_SUBPATHS = {
+    "react/": ["jsx-runtime", "jsx-dev-runtime"],
+    "react-dom/": ["client"],
+}
+
+ESM_IMPORT_PATTERN = re.compile(r'((?:\bfrom|\bimport)\s*\(?\s*)(["\'])((?:https://esm\.sh)?/[^"\'\s]*)\2')
+
+_vendor_manifest = None
+
+
+def vendor_module_name(url):
+    # local name for an esm.sh url; files get a .js suffix so "react@19" and "react@19/" can coexist
+    parts = urlsplit(url)
+    name = parts.path
+    if parts.query:
+        name += "__" + hashlib.sha1(parts.query.encode()).hexdigest()[:10]
+    return name
+
+
+def vendor_file_path(name, vendor_dir=VENDOR_DIR):
+    root = os.path.realpath(vendor_dir)
+    path = os.path.realpath(os.path.join(root, name.lstrip("/") + ".js"))
+    if not path.startswith(root + os.sep):
+        return None
+    return path
+
+
+def vendor_esm_modules(vendor_dir=VENDOR_DIR):
+    # crawls the module graph behind every react_imports entry and rewrites imports to VENDOR_ROUTE
+    entries = {}
+    for key, url in react_imports.items():
+        if key.endswith("/"):
+            for subpath in VENDOR_SUBPATHS.get(key, []):
+                entries[key + subpath] = url + subpath
+        else:
+            entries[key] = url
+
+    # every build gets its own directory, so all served urls stay immutable across rebuilds
+    build = hashlib.sha1(f"{json.dumps(react_imports)}{time.time()}".encode()).hexdigest()[:12]
+    session = requests.Session()
+    pending = list(entries.values())
+    fetched = set()
+    while pending:
+        url = pending.pop()
+        if url in fetched:
+            continue
+        fetched.add(url)
+
+        path = vendor_file_path(build + vendor_module_name(url), vendor_dir)
+        if path is None:
+            logger.warning("skipping %s, it does not map to a file under %s", url, vendor_dir)
+            continue
+        resp = session.get(url, timeout=60)
+        resp.raise_for_status()
+
+        def rewrite(match):
+            target = match.group(3)
+            if target.startswith("/"):
+                target = ESM_ORIGIN + target
+            pending.append(target)
+            return f"{match.group(1)}{match.group(2)}{VENDOR_ROUTE}/{build}{vendor_module_name(target)}{match.group(2)}"
+
+        body = ESM_IMPORT_PATTERN.sub(rewrite, resp.text)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(body)
+        print(f"vendored {url}")
+
+    manifest = {
+        "build": build,
+        "imports": {
+            key: f"{VENDOR_ROUTE}/{build}{vendor_module_name(url)}"
+            for key, url in react_imports.items()
+        },
+        "source": react_imports,
+        "modules": len(fetched),
+        "built_at": int(time.time()),
+    }
+    with open(os.path.join(vendor_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_vendor_manifest():
+    global _vendor_manifest
+    if _vendor_manifest is None:
+        try:
+            with open(os.path.join(VENDOR_DIR, "manifest.json"), encoding="utf-8") as f:
+                manifest = json.load(f)
+            # a stale build no longer matches react_imports and must not be served
+            _vendor_manifest = manifest if manifest.get("source") == react_imports else {}
+        except (OSError, ValueError):
+            _vendor_manifest = {}
+    return _vendor_manifest
+
+
+def resolve_react_imports(base_url=None):
+    manifest = load_vendor_manifest()
+    if not manifest:
+        return react_imports
+    base_url = (PUBLIC_URL if base_url is None else base_url).rstrip("/")
+    return {key: base_url + path for key, path in manifest["imports"].items()}
+
+
+def with_imports(artifact, imports):
+    # artifacts are packaged with the PUBLIC_URL import map; callers serving another origin re-resolve it
+    if artifact and artifact.get("template") == "react":
+        artifact = dict(artifact, imports=imports)
+    return artifact
+
+
+def request_base_url(request):
+    if PUBLIC_URL or request is None:
+        return PUBLIC_URL
+    headers = request.headers
+    host = headers.get("x-forwarded-host") or headers.get("host")
+    if not host:
+        return ""
+    proto = headers.get("x-forwarded-proto") or request.url.scheme
+    return f"{proto.split(',')[0].strip()}://{host}"
+
+
+# static snapshots: react artifacts are bundled once with esbuild and served as plain html/js,
+# cached by artifact hash, so shared links load without in-browser transpilation
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots"))
+SNAPSHOT_ROUTE = "/snapshots"
+SNAPSHOT_FILES = {"index.html": "text/html", "app.js": "text/javascript", "app.css": "text/css"}
+ESBUILD_BIN = os.environ.get("ESBUILD_BIN") or shutil.which("esbuild")
+TAILWIND_BIN = os.environ.get("TAILWIND_BIN") or shutil.which("tailwindcss")
+SNAPSHOTS_ENABLED = os.environ.get("SNAPSHOTS", "1") != "0"
+
+SNAPSHOT_ENTRY = """import { createRoot } from "react-dom/client"
+import Demo from "./demo.tsx"
+
+createRoot(document.getElementById("root")).render(<Demo />)
+"""
+
+SNAPSHOT_HTML = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Groq AI WebDev Snapshot</title>
+<script type="importmap">{import_map}</script>
+{styles}
+</head>
+<body>
+<div id="root"></div>
+<script type="module" src="app.js"></script>
+</body>
+</html>
+"""
+
+
+def artifact_hash(artifact):
+    return hashlib.sha256(f"{artifact['template']}\0{artifact['code']}".encode("utf-8")).hexdigest()
+
+
+def run_bundler(args, cwd):
+    subprocess.run(args, cwd=cwd, check=True, capture_output=True, timeout=120)
+
+
+def bundle_react_snapshot(code, out_dir):
+    with open(os.path.join(out_dir, "demo.tsx"), "w", encoding="utf-8") as f:
+        f.write(code)
+    with open(os.path.join(out_dir, "entry.tsx"), "w", encoding="utf-8") as f:
+        f.write(SNAPSHOT_ENTRY)
+
+    externals = [f"--external:{key}*" if key.endswith("/") else f"--external:{key}" for key in react_imports]
+    run_bundler([ESBUILD_BIN, "entry.tsx", "--bundle", "--format=esm", "--jsx=automatic", "--minify",
+                 "--target=es2020", "--outfile=app.js"] + externals, out_dir)
+
+    styles = '<script type="module">import "@tailwindcss/browser"</script>'
+    if TAILWIND_BIN:
+        with open(os.path.join(out_dir, "input.css"), "w", encoding="utf-8") as f:
+            f.write('@import "tailwindcss" source(none);\n@source "./demo.tsx";\n')
+        try:
+            run_bundler([TAILWIND_BIN, "-i", "input.css", "-o", "app.css", "--minify"], out_dir)
+            styles = '<link rel="stylesheet" href="app.css">'
+        except (OSError, subprocess.SubprocessError):
+            logger.warning("tailwind precompilation failed, falling back to the browser runtime", exc_info=True)
+
+    imports = dict(resolve_react_imports(""))
+    if styles.startswith("<link"):
+        imports.pop("@tailwindcss/browser", None)
+    with open(os.path.join(out_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(SNAPSHOT_HTML.format(import_map=json.dumps({"imports": imports}), styles=styles))
+
+    for name in os.listdir(out_dir):
+        if name not in SNAPSHOT_FILES:
+            os.remove(os.path.join(out_dir, name))
+
+
+def build_snapshot(artifact):
+    # returns the snapshot url path, building it on first use; None when snapshots are unavailable
+    if not SNAPSHOTS_ENABLED or not artifact or not artifact.get("code"):
+        return None
+    digest = artifact_hash(artifact)
+    target = os.path.join(SNAPSHOT_DIR, digest)
+    url = f"{SNAPSHOT_ROUTE}/{digest}/"
+    if os.path.exists(os.path.join(target, "index.html")):
+        return url
+    if artifact["template"] == "react" and not ESBUILD_BIN:
+        return None
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    work_dir = tempfile.mkdtemp(dir=SNAPSHOT_DIR, prefix=".build-")
+    try:
+        if artifact["template"] == "react":
+            bundle_react_snapshot(artifact["code"], work_dir)
+        else:
+            with open(os.path.join(work_dir, "index.html"), "w", encoding="utf-8") as f:
+                f.write(artifact["code"])
+        try:
+            os.rename(work_dir, target)
+        except OSError:
+            # another request built the same artifact first
+            if not os.path.exists(os.path.join(target, "index.html")):
+                raise
+        return url
+    except (OSError, subprocess.SubprocessError):
+        logger.warning("snapshot build failed for %s", digest, exc_info=True)
+        return None
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# persistent artifact store: generation metadata in sqlite, code and responses as content-addressed blobs
+STORE_DIR = os.environ.get("STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+HISTORY_PAGE_SIZE = 10
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    hash TEXT PRIMARY KEY,
+    template TEXT NOT NULL,
+    code_blob TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id TEXT NOT NULL,
+    session_id TEXT,
+    model TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    artifact_hash TEXT REFERENCES artifacts (hash),
+    response_blob TEXT NOT NULL,
+    finish_reason TEXT,
+    edit INTEGER NOT NULL DEFAULT 0,
+    fresh INTEGER NOT NULL DEFAULT 0,
+    duration_ms INTEGER,
+    first_token_ms INTEGER,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS generations_project ON generations (project_id, id);
+CREATE INDEX IF NOT EXISTS generations_session ON generations (session_id, id);
+"""
+
+GENERATION_COLUMNS = (
+    "id", "project_id", "session_id", "model", "prompt", "artifact_hash", "response_blob", "finish_reason",
+    "edit", "fresh", "duration_ms", "first_token_ms", "prompt_tokens", "completion_tokens", "created_at",
+)
+
+
+class ArtifactStore:
+
+    def __init__(self, root=STORE_DIR):
+        self.blob_dir = os.path.join(root, "blobs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, "store.db"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(STORE_SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(generations)")]
+        if "fresh" not in columns:
+            # stores created before the prompt cache
+            self.conn.execute("ALTER TABLE generations ADD COLUMN fresh INTEGER NOT NULL DEFAULT 0")
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest[2:])
+
+    def put_blob(self, content):
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return digest
+
+    def get_blob(self, digest):
+        with open(self.blob_path(digest), encoding="utf-8") as f:
+            return f.read()
+
+    def record_generation(self, project_id, session_id, prompt, event, fresh=False):
+        # fresh: the prompt was answered without history under the default system prompt,
+        # with a complete result that passed validation
+        artifact = event["artifact"]
+        response_blob = self.put_blob(event["response"])
+        artifact_digest = None
+        if artifact.get("code"):
+            artifact_digest = artifact_hash(artifact)
+            code_blob = self.put_blob(artifact["code"])
+
+        usage = event.get("usage") or {}
+        first_token = event.get("first_token")
+        with self.lock, self.conn:
+            if artifact_digest:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO artifacts (hash, template, code_blob, size, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (artifact_digest, artifact["template"], code_blob, len(artifact["code"]), time.time()))
+            cursor = self.conn.execute(
+                "INSERT INTO generations (project_id, session_id, model, prompt, artifact_hash, response_blob, "
+                "finish_reason, edit, fresh, duration_ms, first_token_ms, prompt_tokens, completion_tokens, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (project_id, session_id, event["model"], prompt, artifact_digest, response_blob,
+                 event["finish_reason"], int(bool(event.get("edit"))), int(fresh), int(event["duration"] * 1000),
+                 int(first_token * 1000) if first_token is not None else None,
+                 usage.get("prompt_tokens"), usage.get("completion_tokens"), time.time()))
+        return cursor.lastrowid
+
+    def list_generations(self, project_id=None, limit=HISTORY_PAGE_SIZE, before_id=None, session_id=None):
+        # newest first, keyset-paginated on the (project_id, id) or (session_id, id) index
+        if project_id is not None:
+            query = f"SELECT {', '.join(GENERATION_COLUMNS)} FROM generations WHERE project_id = ?"
+            params = [project_id]
+        else:
+            query = f"SELECT {', '.join(GENERATION_COLUMNS)} FROM generations WHERE session_id = ?"
+            params = [session_id]
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [dict(zip(GENERATION_COLUMNS, row)) for row in rows]
+
+    def list_fresh_generations(self, limit):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, prompt, artifact_hash, response_blob FROM generations "
+                "WHERE fresh = 1 AND artifact_hash IS NOT NULL ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(zip(("id", "prompt", "artifact_hash", "response_blob"), row)) for row in rows]
+
+    def get_artifact(self, digest):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT template, code_blob FROM artifacts WHERE hash = ?", (digest,)).fetchone()
+        if row is None:
+            return None
+        return {"template": row[0], "code": self.get_blob(row[1])}
+
+
+try:
+    artifact_store = ArtifactStore() if os.environ.get("STORE", "1") != "0" else None
+except (OSError, sqlite3.Error):
+    logger.warning("artifact store unavailable, generations will not be persisted", exc_info=True)
+    artifact_store = None
+
+
+# near-duplicate prompt cache: first-turn prompts are indexed by minhash signatures with lsh banding,
+# so a new prompt close to an earlier one can reuse that artifact instead of a full generation.
+# matches above PROMPT_CACHE_SERVE_THRESHOLD are served as is, weaker ones become a patch edit.
+PROMPT_CACHE_ENABLED = os.environ.get("PROMPT_CACHE", "1") != "0"
+PROMPT_CACHE_THRESHOLD = float(os.environ.get("PROMPT_CACHE_THRESHOLD", 0.6))
+PROMPT_CACHE_SERVE_THRESHOLD = float(os.environ.get("PROMPT_CACHE_SERVE_THRESHOLD", 0.9))
+PROMPT_CACHE_SIZE = int(os.environ.get("PROMPT_CACHE_SIZE", 5000))
+# 21 bands of 3 rows: prompts at jaccard 0.6 share a bucket with ~99% probability, at 0.2 with ~15%
+MINHASH_BANDS = 21
+MINHASH_ROWS = 3
+MINHASH_PRIME = (1 << 61) - 1
+MINHASH_PERMUTATIONS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % (MINHASH_PRIME - 1) + 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % MINHASH_PRIME)
+    for i in range(MINHASH_BANDS * MINHASH_ROWS)
+]
+# filler words only; with/without/no/not change what is asked for and are kept
+PROMPT_STOPWORDS = frozenset("""
+a an the and or of for to in on by from at as is are be it its this that these those
+i me my we our you your please make create build generate design write want need like some can could would should
+using use app application page website site web simple nice modern beautiful
+""".split())
+
+
+def prompt_tokens(prompt):
+    tokens = set()
+    for word in re.findall(r"[a-z0-9]+", prompt.lower()):
+        if word in PROMPT_STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.add(word)
+    return tokens
+
+
+def minhash_bands(tokens):
+    hashes = [int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "big") for token in tokens]
+    signature = [min((a * h + b) % MINHASH_PRIME for h in hashes) for a, b in MINHASH_PERMUTATIONS]
+    return [(band, tuple(signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS])) for band in range(MINHASH_BANDS)]
+
+
+class PromptIndex:
+
+    def __init__(self, size=PROMPT_CACHE_SIZE):
+        self.size = size
+        self.lock = threading.Lock()
+        # key -> (tokens, bands, payload), oldest first
+        self.entries = {}
+        self.buckets = {}
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, key, prompt, payload):
+        tokens = prompt_tokens(prompt)
+        if not tokens:
+            return
+        bands = minhash_bands(tokens)
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = (tokens, bands, payload)
+            for band in bands:
+                self.buckets.setdefault(band, set()).add(key)
+            while len(self.entries) > self.size:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        _, bands, _ = self.entries.pop(key)
+        for band in bands:
+            bucket = self.buckets[band]
+            bucket.discard(key)
+            if not bucket:
+                del self.buckets[band]
+
+    def query(self, prompt, threshold=PROMPT_CACHE_THRESHOLD):
+        # best match by exact jaccard among the lsh candidates; newer entries win ties
+        tokens = prompt_tokens(prompt)
+        if not tokens:
+            return None
+        bands = minhash_bands(tokens)
+        best_key, best_similarity = None, 0.0
+        with self.lock:
+            candidates = set().union(*(self.buckets.get(band, ()) for band in bands))
+            for key in candidates:
+                entry_tokens = self.entries[key][0]
+                similarity = len(tokens & entry_tokens) / len(tokens | entry_tokens)
+                if similarity >= threshold and (similarity, key) > (best_similarity, best_key or 0):
+                    best_key, best_similarity = key, similarity
+            if best_key is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(self.entries[best_key][2], similarity=best_similarity)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "threshold": PROMPT_CACHE_THRESHOLD,
+                "serve_threshold": PROMPT_CACHE_SERVE_THRESHOLD,
+            }
+
+
+def load_prompt_index(store):
+    index = PromptIndex()
+    try:
+        rows = store.list_fresh_generations(PROMPT_CACHE_SIZE)
+    except sqlite3.Error:
+        logger.warning("failed to load the prompt cache from the store", exc_info=True)
+        return index
+    for row in reversed(rows):
+        index.add(row["id"], row["prompt"], {
+            "generation_id": row["id"],
+            "prompt": row["prompt"],
+            "artifact_hash": row["artifact_hash"],
+            "response_blob": row["response_blob"],
+        })
+    return index
+
+
+# cached artifacts live in the store, so the cache needs it
+prompt_index = load_prompt_index(artifact_store) if PROMPT_CACHE_ENABLED and artifact_store is not None else None
+
+
+# headless generation pipeline (shared by the UI, the REST API and batch mode)
+def get_generated_files(text):
+    patterns = {
+        'html': r'```(?:html|svg|xml)\n(.+?)\n```',
+        'jsx': r'```jsx\n(.+?)\n```',
+        'tsx': r'```tsx\n(.+?)\n```',
+    }
+    result = {}
+
+    for ext, pattern in patterns.items():
+        matches = re.findall(pattern, text, re.DOTALL)
+        if matches:
+            content = '\n'.join(matches).strip()
+            result[f'index.{ext}'] = content
+
+    if len(result) == 0:
+        result["index.html"] = text.strip()
+    return result
+
+
+def get_model_max_tokens(selected_model):
+    for model in AVAILABLE_MODELS:
+        if model["value"] == selected_model:
+            return model["max_tokens"]
+    return 8192
+
+
+def build_messages(prompt, system_prompt=None, history=None):
+    messages = [{
+        'role': "system",
+        "content": system_prompt or SYSTEM_PROMPT
+    }] + list(history or [])
+
+    messages.append({'role': "user", 'content': prompt.strip()})
+    return messages
+
+
+def package_artifact(response):
+    generated_files = get_generated_files(response)
+    react_code = generated_files.get("index.tsx") or generated_files.get("index.jsx")
+    html_code = generated_files.get("index.html")
+
+    if react_code:
+        return {
+            "template": "react",
+            "code": react_code,
+            "imports": resolve_react_imports(),
+            "files": {"./index.tsx": REACT_ENTRY, "./demo.tsx": react_code},
+        }
+    return {
+        "template": "html",
+        "code": html_code,
+        "imports": {},
+        "files": {"./index.html": html_code},
+    }
+
+
+# adaptive completion budgets: instead of reserving each model's full max_tokens against the
+# tokens-per-minute quota, request roughly the p90 of recent output lengths for the same kind of
+# request and continue automatically when a response is cut off
+BUDGET_DEFAULTS = {"generate:react": 4096, "generate:html": 4096, "refine": 1536, "repair": 1024}
+BUDGET_HEADROOM = 1.3
+BUDGET_MIN_TOKENS = 512
+BUDGET_MIN_SAMPLES = 5
+BUDGET_WINDOW = 50
+MAX_CONTINUATIONS = 2
+FINISHED_REASONS = ('stop', 'length')
+
+CONTINUE_PROMPT = """Your previous message was cut off by the output limit. Continue exactly where it ended,
+without repeating anything and without opening a new code block."""
+
+
+def classify_prompt(prompt):
+    text = prompt.lower()
+    if "html" in text or "svg" in text:
+        return "generate:html"
+    return "generate:react"
+
+
+class CompletionBudget:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def estimate(self, model, kind, scale=1.0):
+        ceiling = get_model_max_tokens(model)
+        with self.lock:
+            samples = sorted(self.samples.get((model, kind), ()))
+        if len(samples) < BUDGET_MIN_SAMPLES:
+            budget = BUDGET_DEFAULTS.get(kind, ceiling)
+        else:
+            budget = samples[int(0.9 * (len(samples) - 1))] * BUDGET_HEADROOM
+        return int(max(BUDGET_MIN_TOKENS, min(budget * scale, ceiling)))
+
+    def observe(self, model, kind, completion_tokens):
+        if not completion_tokens:
+            return
+        with self.lock:
+            self.samples.setdefault((model, kind), deque(maxlen=BUDGET_WINDOW)).append(completion_tokens)
+
+    def stats(self):
+        with self.lock:
+            return {
+                f"{model}|{kind}": {"samples": len(samples), "max": max(samples)}
+                for (model, kind), samples in self.samples.items()
+            }
+
+
+completion_budget = CompletionBudget()
+
+
+def stream_completion(messages, model=DEFAULT_MODEL, cancel_event=None, temperature=1, kind="generate:react",
+                      budget_scale=1.0):
+    # yields {"type": "delta", ...} events while streaming and a final {"type": "done", ...};
+    # responses cut off by the token budget are continued up to MAX_CONTINUATIONS times.
+    # a reduced `budget_scale` (load shedding) also disables continuations, which would re-send the prompt
+    max_continuations = MAX_CONTINUATIONS if budget_scale >= 1 else 0
+    started_at = time.time()
+    response = ""
+    finish_reason = None
+    first_token_at = None
+    usage = None
+    continuations = 0
+    request_messages = messages
+
+    while True:
+        completion = client.chat.completions.create(
+            model=model,
+            messages=request_messages,
+            temperature=temperature,
+            max_completion_tokens=completion_budget.estimate(model, kind, budget_scale),
+            top_p=1,
+            stream=True,
+            stop=None
+        )
+
+        # a continuation may reopen the code fence; hold its first line back until we know
+        pending = "" if continuations else None
+        finish_reason = None
+        for chunk in completion:
+            if cancel_event is not None and cancel_event.is_set():
+                completion.close()
+                finish_reason = "cancelled"
+                break
+            # groq reports token usage on the last chunk
+            chunk_usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or getattr(chunk, "usage", None)
+            if chunk_usage:
+                usage = {
+                    "prompt_tokens": (usage or {}).get("prompt_tokens", 0) + chunk_usage.prompt_tokens,
+                    "completion_tokens": (usage or {}).get("completion_tokens", 0) + chunk_usage.completion_tokens,
+                }
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content and pending is not None:
+                pending += content
+                if "\n" not in pending:
+                    content = None
+                else:
+                    first_line, rest = pending.split("\n", 1)
+                    content = rest if re.fullmatch(r'\s*```\w*\s*', first_line) and find_unclosed_fence(response) \
+                        else pending
+                    pending = None
+            if content:
+                if first_token_at is None:
+                    first_token_at = time.time()
+                response += content
+                yield {"type": "delta", "content": content, "response": response}
+
+            if chunk.choices[0].finish_reason:
+                finish_reason = chunk.choices[0].finish_reason
+
+        if pending:
+            response += pending
+            yield {"type": "delta", "content": pending, "response": response}
+        if finish_reason != 'length' or continuations >= max_continuations:
+            break
+        continuations += 1
+        request_messages = messages + [
+            {'role': "assistant", 'content': response},
+            {'role': "user", 'content': CONTINUE_PROMPT},
+        ]
+
+    # outputs cut short by a reduced budget would drag the estimate down
+    if usage and (finish_reason == 'stop' or (finish_reason == 'length' and budget_scale >= 1)):
+        completion_budget.observe(model, kind, usage["completion_tokens"])
+
+    yield {
+        "type": "done",
+        "model": model,
+        "finish_reason": finish_reason,
+        "response": response,
+        "duration": time.time() - started_at,
+        "first_token": first_token_at - started_at if first_token_at else None,
+        "usage": usage,
+        "continuations": continuations,
+    }
+
+
+def stream_generation(prompt, system_prompt=None, history=None, model=DEFAULT_MODEL, cancel_event=None,
+                      budget_scale=1.0):
+    messages = build_messages(prompt, system_prompt, history)
+    for event in stream_completion(messages, model, cancel_event, kind=classify_prompt(prompt),
+                                   budget_scale=budget_scale):
+        if event["type"] == "done":
+            event["history"] = messages + [{'role': "assistant", 'content': event["response"]}]
+            event["artifact"] = package_artifact(event["response"])
+        yield event
+
+
+def parse_edit_blocks(text):
+    return [
+        (search.rstrip("\n"), replace.rstrip("\n"))
+        for search, replace in EDIT_BLOCK_PATTERN.findall(text)
+    ]
+
+
+def apply_edit_blocks(code, blocks):
+    # returns the edited code, or None when any block does not match the current file exactly once
+    if not blocks:
+        return None
+    for search, replace in blocks:
+        if search.strip() and search in code:
+            if code.count(search) > 1:
+                return None
+            code = code.replace(search, replace, 1)
+            continue
+
+        # retry ignoring indentation and trailing whitespace, which models often get wrong
+        search_lines = [line.strip() for line in search.strip("\n").split("\n")]
+        if not any(search_lines):
+            return None
+        lines = code.split("\n")
+        stripped = [line.strip() for line in lines]
+        matches = [i for i in range(len(lines) - len(search_lines) + 1)
+                   if stripped[i:i + len(search_lines)] == search_lines]
+        if len(matches) != 1:
+            return None
+        i = matches[0]
+        lines[i:i + len(search_lines)] = replace.split("\n") if replace else []
+        code = "\n".join(lines)
+    return code
+
+
+def artifact_language(artifact):
+    return "jsx" if artifact["template"] == "react" else "html"
+
+
+def build_edit_messages(prompt, system_prompt, history, artifact, instructions):
+    messages = [{
+        'role': "system",
+        "content": (system_prompt or SYSTEM_PROMPT) + "\n\n" + instructions
+    }] + list(history or [])
+    lang = artifact_language(artifact)
+    messages.append({
+        'role': "user",
+        'content': f"Current file:\n```{lang}\n{artifact['code']}\n```\n\n{prompt.strip()}"
+    })
+    return messages
+
+
+def stream_edit(prompt, system_prompt=None, history=None, artifact=None, model=DEFAULT_MODEL, cancel_event=None,
+                budget_scale=1.0):
+    # refinement turn: the model answers with SEARCH/REPLACE blocks against the latest artifact,
+    # falling back to a full regeneration when they do not apply
+    messages = build_edit_messages(prompt, system_prompt, history, artifact, EDIT_INSTRUCTIONS)
+
+    for event in stream_completion(messages, model, cancel_event, kind="refine", budget_scale=budget_scale):
+        if event["type"] == "delta":
+            yield event
+            continue
+
+        patch = event["response"]
+        response = patch
+        blocks = parse_edit_blocks(patch)
+        # models often fence their edit blocks anyway; only a reply without blocks is a full rewrite
+        if event["finish_reason"] in FINISHED_REASONS and (blocks or not has_code_fence(patch)):
+            code = apply_edit_blocks(artifact["code"], blocks)
+            if code is None or event["finish_reason"] == 'length':
+                yield {"type": "fallback", "reason": "The edit could not be applied to the current file"}
+                yield from stream_generation(prompt, system_prompt, history, model, cancel_event, budget_scale)
+                return
+            response = f"```{artifact_language(artifact)}\n{code}\n```"
+
+        event.update({
+            "edit": True,
+            "patch": patch,
+            "response": response,
+            "history": build_messages(prompt, system_prompt, history) + [{'role': "assistant", 'content': response}],
+            "artifact": package_artifact(response),
+        })
+        yield event
+
+
+def is_balanced(code):
+    # cheap bracket/quote balance scan; good enough to spot truncated or mangled output
+    pairs = {')': '(', ']': '[', '}': '{'}
+    stack = []
+    quote = None
+    i = 0
+    while i < len(code):
+        char = code[i]
+        if quote:
+            if char == '\\':
+                i += 1
+            elif char == quote:
+                quote = None
+            elif char == '\n' and quote != '`':
+                # apostrophes in jsx/html text never close; plain strings can't span lines
+                quote = None
+        elif char in '"`' or (char == "'" and not (i and code[i - 1].isalnum())):
+            quote = char
+        elif code.startswith('//', i) and (i == 0 or code[i - 1] != ':'):
+            newline = code.find('\n', i)
+            i = len(code) if newline == -1 else newline
+            continue
+        elif code.startswith('/*', i):
+            end = code.find('*/', i + 2)
+            if end == -1:
+                return False
+            i = end + 2
+            continue
+        elif char in '([{':
+            stack.append(char)
+        elif char in ')]}':
+            if not stack or stack.pop() != pairs[char]:
+                return False
+        i += 1
+    return not stack and quote != '`'
+
+
+HTML_VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr",
+}
+# closing tags the html spec lets authors omit
+HTML_OPTIONAL_CLOSE_TAGS = {
+    "html", "head", "body", "p", "li", "dt", "dd", "option", "optgroup", "rt", "rp",
+    "thead", "tbody", "tfoot", "tr", "td", "th", "colgroup", "caption",
+}
+
+
+class TagBalanceParser(HTMLParser):
+    # tolerant parser: only reports elements that are opened and never closed
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.scripts = []
+        self.in_script = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in HTML_VOID_TAGS:
+            return
+        self.stack.append(tag)
+        self.in_script = tag == "script"
+
+    def handle_startendtag(self, tag, attrs):
+        pass
+
+    def handle_endtag(self, tag):
+        self.in_script = False
+        if tag in self.stack:
+            while self.stack:
+                if self.stack.pop() == tag:
+                    break
+
+    def handle_data(self, data):
+        if self.in_script:
+            self.scripts.append(data)
+
+    def unclosed_tags(self):
+        return [tag for tag in self.stack if tag not in HTML_OPTIONAL_CLOSE_TAGS]
+
+
+def has_code_fence(response):
+    return bool(re.search(r'```(html|svg|xml|jsx|tsx)\n', response))
+
+
+def is_renderable(response):
+    # svg/xml answers (e.g. to the svg example) render as html, even without a fence
+    return has_code_fence(response) or response.strip().startswith("<") or "<svg" in response
+
+
+def find_unclosed_fence(response):
+    fences = re.findall(r'^\s*```', response, re.MULTILINE)
+    return len(fences) % 2 == 1
+
+
+def find_imports(code):
+    return re.findall(r'^\s*(?:import|export)\s+(?:[^;]*?\s+from\s+)?["\']([^"\']+)["\']', code, re.MULTILINE)
+
+
+def is_supported_import(specifier):
+    if specifier in react_imports:
+        return True
+    return any(key.endswith("/") and specifier.startswith(key) for key in react_imports)
+
+
+def validate_html(code):
+    problems = []
+    parser = TagBalanceParser()
+    try:
+        parser.feed(code)
+        parser.close()
+    except Exception as e:
+        return [f"HTML could not be parsed: {e}"]
+    unclosed = parser.unclosed_tags()
+    if unclosed:
+        problems.append("Unclosed HTML tags: " + ", ".join(f"<{tag}>" for tag in unclosed))
+    for script in parser.scripts:
+        if script.strip() and not is_balanced(script):
+            problems.append("Unbalanced brackets or unterminated string in a <script> block")
+            break
+    return problems
+
+
+def validate_react(code):
+    problems = []
+    if not re.search(r'^\s*export\s+default\b', code, re.MULTILINE):
+        problems.append("Missing `export default` component")
+    unsupported = [specifier for specifier in find_imports(code) if not is_supported_import(specifier)]
+    if unsupported:
+        problems.append("Unsupported imports (not installed): " + ", ".join(f"'{s}'" for s in unsupported))
+    if not is_balanced(code):
+        problems.append("Unbalanced brackets or unterminated string")
+    return problems
+
+
+def validate_response(response):
+    # fast pre-flight checks run before an artifact is sent to the sandbox; returns a list of problems
+    if find_unclosed_fence(response):
+        return ["Unclosed ``` code fence (the output was cut off)"]
+    if not is_renderable(response):
+        return ["No ```html, ```jsx, ```tsx or ```svg code block found"]
+
+    artifact = package_artifact(response)
+    if not artifact["code"]:
+        return ["Empty code block"]
+    if artifact["template"] == "react":
+        return validate_react(artifact["code"])
+    return validate_html(artifact["code"])
+
+
+def is_valid_artifact(response):
+    return not validate_response(response)
+
+
+def autofix_response(response):
+    # cheap deterministic fixes, applied before asking the model for a repair
+    if find_unclosed_fence(response):
+        response = response.rstrip() + "\n```"
+
+    artifact = package_artifact(response)
+    code = artifact["code"]
+    if not code or not has_code_fence(response):
+        return response
+
+    fixed = code
+    if artifact["template"] == "react":
+        if not re.search(r'^\s*export\s+default\b', fixed, re.MULTILINE):
+            components = re.findall(r'^(?:function|const|class)\s+([A-Z]\w*)', fixed, re.MULTILINE)
+            if components:
+                name = "App" if "App" in components else components[-1]
+                fixed = fixed.rstrip() + f"\n\nexport default {name};"
+    else:
+        parser = TagBalanceParser()
+        try:
+            parser.feed(fixed)
+            parser.close()
+            unclosed = parser.unclosed_tags()
+        except Exception:
+            unclosed = []
+        if unclosed:
+            fixed = fixed.rstrip() + "\n" + "".join(f"</{tag}>" for tag in reversed(unclosed))
+
+    if fixed != code:
+        response = response.replace(code, fixed, 1)
+    return response
+
+
+def request_repair(response, problems, model, budget_scale=1.0):
+    artifact = package_artifact(response)
+    lang = artifact_language(artifact)
+    messages = [
+        {'role': "system", "content": REPAIR_PROMPT},
+        {'role': "user", "content": f"```{lang}\n{artifact['code']}\n```\n\nProblems:\n"
+                                    + "\n".join(f"- {problem}" for problem in problems)},
+    ]
+    completion = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=0.2,
+        max_completion_tokens=completion_budget.estimate(model, "repair", budget_scale),
+        top_p=1,
+        stream=False,
+        stop=None
+    )
+    if completion.usage:
+        completion_budget.observe(model, "repair", completion.usage.completion_tokens)
+    content = completion.choices[0].message.content or ""
+    if has_code_fence(content):
+        return content
+    code = apply_edit_blocks(artifact["code"], parse_edit_blocks(content))
+    if code is None:
+        return response
+    return response.replace(artifact["code"], code, 1)
+
+
+def stream_repair(event, budget_scale=1.0):
+    # validates a finished generation, applying autofixes and at most one targeted model repair.
+    # yields {"type": "repairing", ...} only when that repair is requested, then the final done event
+    response = event["response"]
+    problems = validate_response(response)
+    repairs = []
+
+    if problems:
+        fixed = autofix_response(response)
+        if fixed != response:
+            repairs.append("autofix")
+            response = fixed
+            problems = validate_response(response)
+
+    repair_error = None
+    if problems and is_renderable(response):
+        yield {"type": "repairing", "problems": problems}
+        try:
+            repaired = request_repair(response, problems, event["model"], budget_scale)
+        except Exception as e:
+            # a failed repair call (rate limit, timeout) keeps the unrepaired but complete response
+            logger.warning("repair request failed for %s", event["model"], exc_info=True)
+            repair_error = f"{type(e).__name__}: {e}"
+        else:
+            repaired_problems = validate_response(repaired)
+            if len(repaired_problems) < len(problems):
+                repairs.append("model")
+                response, problems = repaired, repaired_problems
+
+    if repairs:
+        event = dict(event)
+        event["response"] = response
+        event["artifact"] = package_artifact(response)
+        event["history"] = event["history"][:-1] + [{'role': "assistant", 'content': response}]
+    event["problems"] = problems
+    event["repairs"] = repairs
+    event["repair_error"] = repair_error
+    yield event
+
+
+def candidate_models(selected_model, count, mix_models=False):
+    count = max(1, min(int(count or 1), MAX_CANDIDATES))
+    if not mix_models:
+        return [selected_model] * count
+    values = [model["value"] for model in AVAILABLE_MODELS]
+    start = values.index(selected_model) if selected_model in values else 0
+    return [values[(start + i) % len(values)] for i in range(count)]
+
+
+def stream_candidates(prompt, system_prompt=None, history=None, models=(DEFAULT_MODEL,), strategy="fastest",
+                      cancel_event=None, budget_scale=1.0):
+    # races one generation per model; "fastest" streams whichever candidate produces output first,
+    # "first_valid" waits for the first finished candidate that passes is_valid_artifact.
+    # losing candidates are cancelled as soon as a winner is known, all of them when `cancel_event` is set.
+    events = queue.Queue()
+    cancel_events = [threading.Event() for _ in models]
+
+    def run_candidate(index, model):
+        try:
+            for event in stream_generation(prompt, system_prompt, history, model, cancel_events[index],
+                                           budget_scale):
+                events.put((index, event))
+        except Exception as e:
+            events.put((index, {"type": "error", "error": e}))
+        finally:
+            events.put((index, None))
+
+    def cancel_losers(winner):
+        for index, cancel_event in enumerate(cancel_events):
+            if index != winner:
+                cancel_event.set()
+
+    for index, model in enumerate(models):
+        threading.Thread(target=run_candidate, args=(index, model), daemon=True).start()
+
+    def check_cancelled():
+        if cancel_event is not None and cancel_event.is_set():
+            for candidate_cancel_event in cancel_events:
+                candidate_cancel_event.set()
+            return True
+        return False
+
+    winner = None
+    running = len(models)
+    finished = []
+    errors = []
+    try:
+        while running:
+            try:
+                index, event = events.get(timeout=0.5)
+            except queue.Empty:
+                if check_cancelled():
+                    return
+                continue
+            if check_cancelled():
+                return
+            if event is None:
+                running -= 1
+                continue
+            if event["type"] == "error":
+                if index == winner:
+                    raise event["error"]
+                errors.append(event["error"])
+                continue
+            event["candidate"] = index
+
+            if strategy == "first_valid":
+                if event["type"] == "delta":
+                    yield {"type": "progress", "candidate": index, "model": models[index],
+                           "response": event["response"]}
+                else:
+                    if event["finish_reason"] in FINISHED_REASONS and is_valid_artifact(event["response"]):
+                        cancel_losers(index)
+                        yield event
+                        return
+                    finished.append(event)
+                continue
+
+            if winner is None and event["type"] == "delta":
+                winner = index
+                cancel_losers(winner)
+            if index == winner:
+                yield event
+                if event["type"] == "done":
+                    return
+            elif winner is None:
+                finished.append(event)
+
+        if finished:
+            yield finished[0]
+        elif errors:
+            raise errors[0]
+    finally:
+        for candidate_cancel_event in cancel_events:
+            candidate_cancel_event.set()
+
+
+def record_generation(project_id, session_id, prompt, event, fresh=False):
+    if artifact_store is None or not project_id:
+        return None
+    # cached designs are replayed without validation, so only clean, complete results are
+    # marked fresh, both for the live index and for rebuilding it from the store
+    fresh = fresh and event["finish_reason"] == "stop" and not event.get("problems")
+    try:
+        generation_id = artifact_store.record_generation(project_id, session_id, prompt.strip(), event, fresh)
+    except (OSError, sqlite3.Error):
+        logger.warning("failed to persist generation for project %s", project_id, exc_info=True)
+        return None
+    if fresh and prompt_index is not None and event["artifact"].get("code"):
+        prompt_index.add(generation_id, prompt, {
+            "generation_id": generation_id,
+            "prompt": prompt.strip(),
+            "artifact_hash": artifact_hash(event["artifact"]),
+            "response_blob": hashlib.sha256(event["response"].encode("utf-8")).hexdigest(),
+        })
+    return generation_id
+
+
+def find_reusable_artifact(prompt, system_prompt=None, history=None, artifact=None,
+                           threshold=PROMPT_CACHE_THRESHOLD, serve_threshold=PROMPT_CACHE_SERVE_THRESHOLD):
+    # only context-free requests are comparable: no history, no current artifact, the default system prompt
+    if prompt_index is None or history or (artifact and artifact.get("code")):
+        return None
+    if (system_prompt or SYSTEM_PROMPT).strip() != SYSTEM_PROMPT.strip():
+        return None
+    match = prompt_index.query(prompt, threshold)
+    if match is None:
+        return None
+    try:
+        match["artifact"] = artifact_store.get_artifact(match["artifact_hash"])
+        match["response"] = artifact_store.get_blob(match["response_blob"])
+    except (OSError, sqlite3.Error):
+        logger.warning("cached generation %s is unreadable", match["generation_id"], exc_info=True)
+        return None
+    # served as is, otherwise used as the base for a patch edit
+    match["serve"] = match["similarity"] >= serve_threshold
+    return match if match["artifact"] else None
+
+
+def cached_generation(prompt, system_prompt, match):
+    # a done event built from a stored generation, without calling the model
+    response = match["response"]
+    return {
+        "type": "done",
+        "model": "cache",
+        "finish_reason": "stop",
+        "response": response,
+        "duration": 0.0,
+        "first_token": None,
+        "usage": None,
+        "continuations": 0,
+        "history": build_messages(prompt, system_prompt) + [{'role': "assistant", 'content': response}],
+        "artifact": package_artifact(response),
+        "problems": [],
+        "repairs": [],
+        "repair_error": None,
+    }
+
+
+def stream_pipeline(prompt, system_prompt=None, history=None, models=(DEFAULT_MODEL,), strategy="fastest",
+                    validate=True, artifact=None, project_id=None, session_id=None, cancel_event=None, reuse=None,
+                    budget_scale=1.0):
+    # full generation pipeline: candidates (or a patch against `artifact`) -> extraction ->
+    # pre-flight validation and repair -> persistence under `project_id`.
+    # `reuse` is a find_reusable_artifact match, served as is or used as the base for a patch.
+    fresh = not history and not (artifact and artifact.get("code")) \
+        and (system_prompt or SYSTEM_PROMPT).strip() == SYSTEM_PROMPT.strip()
+    cached = None
+    if reuse:
+        cached = {"generation_id": reuse["generation_id"], "prompt": reuse["prompt"],
+                  "similarity": round(reuse["similarity"], 3)}
+        yield dict(cached, type="cache_hit")
+
+    if reuse and reuse["serve"]:
+        events = [cached_generation(prompt, system_prompt, reuse)]
+        # already indexed under the original prompt
+        fresh = validate = False
+    elif reuse:
+        events = stream_edit(prompt, system_prompt, history, reuse["artifact"], models[0], cancel_event, budget_scale)
+    elif artifact and artifact.get("code"):
+        events = stream_edit(prompt, system_prompt, history, artifact, models[0], cancel_event, budget_scale)
+    else:
+        events = stream_candidates(prompt, system_prompt, history, models, strategy, cancel_event, budget_scale)
+
+    for event in events:
+        if validate and event["type"] == "done" and event["finish_reason"] in FINISHED_REASONS:
+            for repair_event in stream_repair(event, budget_scale):
+                if repair_event["type"] == "repairing":
+                    yield repair_event
+            event = repair_event
+        if event["type"] == "done" and event["finish_reason"] in FINISHED_REASONS:
+            if cached:
+                event["cached"] = cached
+            event["generation_id"] = record_generation(project_id, session_id, prompt, event, fresh)
+        yield event
+
+
+def generate(prompt, system_prompt=None, history=None, model=DEFAULT_MODEL,
+             candidates=1, strategy="fastest", mix_models=False, artifact=None, project_id=None, session_id=None,
+             cancel_event=None, use_cache=False, reuse=None, budget_scale=1.0):
+    models = candidate_models(model, candidates, mix_models)
+    if use_cache and reuse is None:
+        reuse = find_reusable_artifact(prompt, system_prompt, history, artifact)
+    result = None
+    for event in stream_pipeline(prompt, system_prompt, history, models, strategy, artifact=artifact,
+                                 project_id=project_id, session_id=session_id, cancel_event=cancel_event,
+                                 reuse=reuse, budget_scale=budget_scale):
+        if event["type"] == "done":
+            result = event
+    return result
+
+
+# fair scheduling: at most GENERATION_SLOTS upstream generations run at once. waiting requests are
+# ordered by weighted fair queuing across sessions (start-time fair queuing on virtual finish tags),
+# so a busy session only delays itself, and cheap refinements are dispatched ahead of full generations.
+GENERATION_SLOTS = int(os.environ.get("GENERATION_SLOTS", 32))
+# running generations per session (or per client address for api calls without a session id)
+SESSION_ACTIVE_LIMIT = int(os.environ.get("SESSION_ACTIVE_LIMIT", 1))
+# cached answers are served without taking a slot
+SCHEDULER_COSTS = {"cached": 0, "refine": 1, "generate": 4}
+# smoothing of the per-slot generation time, which follows upstream latency
+SCHEDULER_LATENCY_ALPHA = 0.2
+
+
+class GenerationTicket:
+
+    def __init__(self, session_id, kind, cost):
+        self.session_id = session_id
+        self.kind = kind
+        self.cost = cost
+        self.finish_tag = 0.0
+        self.submitted_at = time.time()
+        self.granted_at = None
+        self.granted = threading.Event()
+        self.cancel_event = threading.Event()
+        self.released = False
+
+    @property
+    def superseded(self):
+        return self.cancel_event.is_set()
+
+    def wait(self, timeout=None):
+        # true once the ticket may run; returns early when it is superseded
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.granted.is_set() and not self.cancel_event.is_set():
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                break
+            self.granted.wait(0.1 if remaining is None else min(0.1, remaining))
+        return self.granted.is_set() and not self.cancel_event.is_set()
+
+
+class GenerationScheduler:
+
+    def __init__(self, slots=GENERATION_SLOTS, session_limit=SESSION_ACTIVE_LIMIT):
+        self.slots = slots
+        self.session_limit = session_limit
+        self.lock = threading.Lock()
+        self.waiting = []
+        self.running = 0
+        self.active = {}
+        self.sessions = {}
+        self.session_finish = {}
+        self.virtual_time = 0.0
+        self.sequence = itertools.count()
+        self.superseded_total = 0
+        self.latency = None
+        self.latency_at = None
+
+    def submit(self, session_id, kind="generate", weight=1, supersede=True):
+        # a newer submit from the same session supersedes (cancels) the older one; without
+        # `supersede` the session id is only the fairness key and earlier tickets keep running
+        ticket = GenerationTicket(session_id, kind, SCHEDULER_COSTS.get(kind, SCHEDULER_COSTS["generate"]) * weight)
+        with self.lock:
+            if supersede:
+                previous = self.sessions.get(session_id)
+                if previous is not None and not previous.released:
+                    previous.cancel_event.set()
+                    self.superseded_total += 1
+                    if not previous.granted.is_set() and self.session_finish.get(session_id) == previous.finish_tag:
+                        # it never ran, so its cost is refunded to the session
+                        self.session_finish[session_id] = previous.finish_tag - previous.cost
+                self.sessions[session_id] = ticket
+            if not ticket.cost:
+                ticket.granted_at = time.time()
+                ticket.granted.set()
+                return ticket
+            start = max(self.virtual_time, self.session_finish.get(session_id, 0.0))
+            ticket.finish_tag = start + ticket.cost
+            self.session_finish[session_id] = ticket.finish_tag
+            heapq.heappush(self.waiting, (ticket.finish_tag, next(self.sequence), ticket))
+            self._dispatch()
+        return ticket
+
+    def release(self, ticket):
+        with self.lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.granted.is_set() and ticket.cost:
+                self.running -= 1
+                self.active[ticket.session_id] -= 1
+                if not self.active[ticket.session_id]:
+                    del self.active[ticket.session_id]
+                if not ticket.superseded:
+                    duration = time.time() - ticket.granted_at
+                    self.latency = duration if self.latency is None else \
+                        SCHEDULER_LATENCY_ALPHA * duration + (1 - SCHEDULER_LATENCY_ALPHA) * self.latency
+                    self.latency_at = time.time()
+            if self.sessions.get(ticket.session_id) is ticket:
+                del self.sessions[ticket.session_id]
+            if self.session_finish.get(ticket.session_id, 0.0) <= self.virtual_time:
+                self.session_finish.pop(ticket.session_id, None)
+            self._dispatch()
+
+    def _dispatch(self):
+        deferred = []
+        while self.waiting and self.running < self.slots:
+            entry = heapq.heappop(self.waiting)
+            finish_tag, _, ticket = entry
+            if ticket.superseded or ticket.released:
+                continue
+            if self.active.get(ticket.session_id, 0) >= self.session_limit:
+                # the session already has its share running, later requests queue behind it
+                deferred.append(entry)
+                continue
+            self.virtual_time = max(self.virtual_time, finish_tag - ticket.cost)
+            self.running += 1
+            self.active[ticket.session_id] = self.active.get(ticket.session_id, 0) + 1
+            ticket.granted_at = time.time()
+            ticket.granted.set()
+        for entry in deferred:
+            heapq.heappush(self.waiting, entry)
+
+    def position(self, ticket):
+        with self.lock:
+            return sum(
+                1 for finish_tag, _, other in self.waiting
+                if finish_tag < ticket.finish_tag and not other.superseded and not other.released
+            ) + 1
+
+    def stats(self):
+        with self.lock:
+            waiting = [ticket for _, _, ticket in self.waiting if not ticket.superseded and not ticket.released]
+            return {
+                "slots": self.slots,
+                "session_limit": self.session_limit,
+                "running": self.running,
+                "waiting": len(waiting),
+                "waiting_refine": sum(1 for ticket in waiting if ticket.kind == "refine"),
+                "sessions": len(self.sessions),
+                "superseded_total": self.superseded_total,
+                "latency": round(self.latency, 3) if self.latency is not None else None,
+                "latency_age": round(time.time() - self.latency_at, 3) if self.latency_at is not None else None,
+                "oldest_wait": round(time.time() - min((t.submitted_at for t in waiting), default=time.time()), 3),
+            }
+
+
+scheduler = GenerationScheduler()
+
+
+# load shedding: a degradation ladder driven by queue depth (waiting requests per slot) and the smoothed
+# upstream generation time. each level keeps the measures of the levels below it; thresholds are
+# comma-separated values for levels 1-4.
+SHED_LEVELS = ("normal", "fast_model", "low_budget", "cached", "busy")
+SHED_QUEUE_DEPTH = [float(value) for value in os.environ.get("SHED_QUEUE_DEPTH", "0.25,0.5,1,2").split(",")]
+SHED_LATENCY = [float(value) for value in os.environ.get("SHED_LATENCY", "30,45,60,90").split(",")]
+# a smaller model than DEFAULT_MODEL, so the first step changes something for most users
+SHED_FAST_MODEL = os.environ.get("SHED_FAST_MODEL", "qwen/qwen3-32b")
+SHED_BUDGET_SCALE = float(os.environ.get("SHED_BUDGET_SCALE", 0.6))
+SHED_CACHE_THRESHOLD = float(os.environ.get("SHED_CACHE_THRESHOLD", 0.4))
+# assumed seconds per generation until one has been measured
+SHED_DEFAULT_LATENCY = 20.0
+# the latency average only moves when a generation finishes, so older measurements fade with this half-life
+SHED_LATENCY_HALF_LIFE = float(os.environ.get("SHED_LATENCY_HALF_LIFE", 60))
+
+
+class LoadShedder:
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.lock = threading.Lock()
+        self.requests = dict.fromkeys(SHED_LEVELS, 0)
+        self.rejected = 0
+
+    def level(self):
+        stats = self.scheduler.stats()
+        depth = stats["waiting"] / stats["slots"]
+        latency = self.live_latency(stats)
+        level = max(
+            sum(1 for threshold in SHED_QUEUE_DEPTH[:len(SHED_LEVELS) - 1] if depth >= threshold),
+            sum(1 for threshold in SHED_LATENCY[:len(SHED_LEVELS) - 1] if latency >= threshold),
+        )
+        if level == SHED_LEVELS.index("busy") and not stats["waiting"]:
+            # a free slot is available; rejecting would also stop the latency estimate from recovering
+            level -= 1
+        return level, stats
+
+    def live_latency(self, stats):
+        # an idle server has no live latency, whatever the last spike was
+        if not stats["running"] or stats["latency"] is None:
+            return 0.0
+        return stats["latency"] * 0.5 ** (stats["latency_age"] / SHED_LATENCY_HALF_LIFE)
+
+    def budget_scale(self, level):
+        # applies to the planned request only, running generations keep their budgets
+        return SHED_BUDGET_SCALE if level >= SHED_LEVELS.index("low_budget") else 1.0
+
+    def estimated_wait(self, stats):
+        # time to reach a free slot plus one generation
+        latency = stats["latency"] or SHED_DEFAULT_LATENCY
+        return int(round((stats["waiting"] / stats["slots"] + 1) * latency))
+
+    def plan(self, prompt, system_prompt=None, history=None, artifact=None, model=DEFAULT_MODEL,
+             candidates=1, use_cache=False):
+        # decides model, candidate count, cache reuse and scheduler kind for one request under the current load
+        level, stats = self.level()
+        plan = {"level": SHED_LEVELS[level], "model": model, "candidates": candidates, "reuse": None, "busy": False,
+                "budget_scale": self.budget_scale(level)}
+
+        if level >= SHED_LEVELS.index("fast_model") and SHED_FAST_MODEL in [m["value"] for m in AVAILABLE_MODELS]:
+            plan["model"] = SHED_FAST_MODEL
+            plan["candidates"] = 1
+        if level >= SHED_LEVELS.index("cached"):
+            plan["reuse"] = find_reusable_artifact(prompt, system_prompt, history, artifact,
+                                                   SHED_CACHE_THRESHOLD, SHED_CACHE_THRESHOLD)
+        elif use_cache and candidates <= 1:
+            # asking for several candidates means asking for new variations, not a stored design
+            plan["reuse"] = find_reusable_artifact(prompt, system_prompt, history, artifact)
+
+        if plan["reuse"] and plan["reuse"]["serve"]:
+            plan["kind"] = "cached"
+        elif plan["reuse"] or (artifact and artifact.get("code")):
+            plan["kind"] = "refine"
+        else:
+            plan["kind"] = "generate"
+
+        # refinements and cached answers are cheap enough to keep serving
+        if level >= SHED_LEVELS.index("busy") and plan["kind"] == "generate":
+            plan["busy"] = True
+            plan["estimated_wait"] = self.estimated_wait(stats)
+
+        with self.lock:
+            self.requests[plan["level"]] += 1
+            self.rejected += plan["busy"]
+        return plan
+
+    def stats(self):
+        level, stats = self.level()
+        with self.lock:
+            return {
+                "level": SHED_LEVELS[level],
+                "queue_depth": round(stats["waiting"] / stats["slots"], 3),
+                "latency": stats["latency"],
+                "live_latency": round(self.live_latency(stats), 3),
+                "estimated_wait": self.estimated_wait(stats),
+                "thresholds": {"queue_depth": SHED_QUEUE_DEPTH, "latency": SHED_LATENCY},
+                "fast_model": SHED_FAST_MODEL,
+                "budget_scale": self.budget_scale(level),
+                "cache_threshold": SHED_CACHE_THRESHOLD,
+                "requests": dict(self.requests),
+                "rejected": self.rejected,
+            }
+
+
+load_shedder = LoadShedder(scheduler)
+
+
+def format_error(e, selected_model):
+    error_type = type(e).__name__
+    error_message = str(e)
+
+    if "authentication" in error_message.lower() or "api key" in error_message.lower():
+        return "🔐 **Authentication Error**: Invalid API key. Please check your Groq API key."
+    elif "rate limit" in error_message.lower():
+        return "⏱️ **Rate Limit**: Too many requests. Please wait a moment and try again."
+    elif "timeout" in error_message.lower():
+        return "⏰ **Timeout Error**: The request took too long. Please try again with a simpler prompt."
+    elif "model" in error_message.lower():
+        return f"🤖 **Model Error**: Issue with model '{selected_model}'. Try selecting a different model."
+    return f"❌ **Error ({error_type})**: {error_message}"
+
+
+# history drawer helpers: only one page of turns is loaded and code blocks are collapsed until selected
+HISTORY_PREVIEW_LINES = 8
+
+
+def list_history_turns(state_value, before=None, limit=HISTORY_PAGE_SIZE):
+    # newest first; returns (turns, cursor of the next older page or None)
+    if artifact_store is not None and state_value.get("project_id"):
+        generations = artifact_store.list_generations(state_value["project_id"], limit + 1, before)
+        turns = [
+            {"id": generation["id"], "prompt": generation["prompt"], "response_blob": generation["response_blob"]}
+            for generation in generations
+        ]
+    else:
+        # history repeats the system message every turn, pair user messages with their answers
+        pairs = []
+        prompt = None
+        for message in state_value["history"]:
+            if message["role"] == "user":
+                prompt = message["content"]
+            elif message["role"] == "assistant" and prompt is not None:
+                pairs.append((prompt, message["content"]))
+                prompt = None
+        end = len(pairs) if before is None else min(before - 1, len(pairs))
+        turns = [
+            {"id": i + 1, "prompt": pairs[i][0], "response": pairs[i][1]}
+            for i in range(end - 1, max(end - limit - 2, -1), -1)
+        ]
+    has_older = len(turns) > limit
+    turns = turns[:limit]
+    return turns, (turns[-1]["id"] if has_older else None)
+
+
+def load_turn_response(turn):
+    if "response" in turn:
+        return turn["response"]
+    return artifact_store.get_blob(turn["response_blob"])
+
+
+def collapse_code(content, max_lines=HISTORY_PREVIEW_LINES):
+    def collapse(match):
+        lines = match.group(2).split("\n")
+        if len(lines) <= max_lines:
+            return match.group(0)
+        preview = "\n".join(lines[:max_lines])
+        return (f"```{match.group(1)}\n{preview}\n```\n"
+                f"*… {len(lines) - max_lines} more lines, click this message to expand*")
+
+    return re.sub(r'```(\w*)\n(.*?)\n```', collapse, content, flags=re.DOTALL)
+
+
 class GradioEvents:
 
     @staticmethod
-    def generate_code(input_value, system_prompt_input_value, state_value, selected_model):
-        
-        def get_generated_files(text):
-            patterns = {
-                'html': r'```html\n(.+?)\n```',
-                'jsx': r'```jsx\n(.+?)\n```',
-                'tsx': r'```tsx\n(.+?)\n```',
-            }
-            result = {}
-
-            for ext, pattern in patterns.items():
-                matches = re.findall(pattern, text, re.DOTALL)
-                if matches:
-                    content = '\n'.join(matches).strip()
-                    result[f'index.{ext}'] = content
-
-            if len(result) == 0:
-                result["index.html"] = text.strip()
-            return result
-        
+    def generate_code(input_value, system_prompt_input_value, state_value, selected_model,
+                      candidate_count=1, candidate_strategy="fastest", mix_models=False, edit_mode=True,
+                      reuse_designs=False, request: gr.Request = None):
+
         if not input_value or input_value.strip() == '':
             yield {
                 output: gr.update(value="⚠️ Please enter a description of what you want to create."),
@@ -219,95 +1852,131 @@ class GradioEvents:
             state_tab: gr.update(active_key="loading"),
             output: gr.update(value=None),
             suggestions_container: gr.update(visible=False),
-            download_btn: gr.update(disabled=True)
+            download_btn: gr.update(disabled=True),
+            snapshot_btn: gr.update(disabled=True)
         }
 
-        messages = [{
-            'role': "system",
-            "content": system_prompt_input_value or SYSTEM_PROMPT
-        }] + state_value["history"]
-
-        messages.append({'role': "user", 'content': input_value.strip()})
-
-        max_tokens = 8192
-        for model in AVAILABLE_MODELS:
-            if model["value"] == selected_model:
-                max_tokens = model["max_tokens"]
-                break
+        progress = {}
 
         try:
-            completion = client.chat.completions.create(
-                model=selected_model,
-                messages=messages,
-                temperature=1,
-                max_completion_tokens=max_tokens,
-                top_p=1,
-                stream=True,
-                stop=None
-            )
-            
-            response = ""
-            for chunk in completion:
-                if chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                    response += content
-                    
+            current_artifact = state_value.get("artifact") if edit_mode else None
+            plan = load_shedder.plan(input_value, system_prompt_input_value, state_value["history"],
+                                     current_artifact, selected_model, candidate_count, reuse_designs)
+            if plan["busy"]:
+                yield {
+                    output: gr.update(value=f"🚦 **Busy**: Too many requests right now. Estimated wait is about "
+                                            f"{plan['estimated_wait']}s, please try again shortly."),
+                    output_loading: gr.update(spinning=False),
+                    state_tab: gr.update(active_key="loading"),
+                }
+                return
+            if plan["model"] != selected_model:
+                gr.Info(f"⚡ High demand: using {plan['model']} with a single candidate for a faster response")
+
+            models = candidate_models(plan["model"], plan["candidates"], mix_models)
+            reuse = plan["reuse"]
+            if not state_value.get("project_id"):
+                state_value["project_id"] = uuid.uuid4().hex
+            session_id = request.session_hash if request else None
+            kind = plan["kind"]
+            ticket = scheduler.submit(session_id or uuid.uuid4().hex, kind, len(models) if kind == "generate" else 1)
+            rendered_artifact = None
+            try:
+                while not ticket.wait(1.0):
+                    if ticket.superseded:
+                        return
                     yield {
-                        output: gr.update(value=response),
-                        output_loading: gr.update(spinning=False),
+                        output: gr.update(value=f"⏳ Waiting for a free generation slot (position {scheduler.position(ticket)})..."),
+                        output_loading: gr.update(spinning=True),
                     }
-                
-                if chunk.choices[0].finish_reason == 'stop':
-                    state_value["history"] = messages + [{
-                        'role': "assistant",
-                        'content': response
-                    }]
-                    
-                    generated_files = get_generated_files(response)
-                    react_code = generated_files.get("index.tsx") or generated_files.get("index.jsx")
-                    html_code = generated_files.get("index.html")
-                    
-                    code_to_download = react_code or html_code
-                    
-                    yield {
-                        output: gr.update(value=response),
-                        download_content: gr.update(value=code_to_download),
-                        state_tab: gr.update(active_key="render"),
-                        output_loading: gr.update(spinning=False),
-                        sandbox: gr.update(
-                            template="react" if react_code else "html",
-                            imports=react_imports if react_code else {},
-                            value={
-                                "./index.tsx": """import Demo from './demo.tsx'
-import "@tailwindcss/browser"
 
-export default Demo
-""",
-                                "./demo.tsx": react_code
-                            } if react_code else {"./index.html": html_code}
-                        ),
-                        state: gr.update(value=state_value),
-                        suggestions_container: gr.update(visible=True),
-                        download_btn: gr.update(disabled=False if code_to_download else True)
-                    }
-                    
+                for event in stream_pipeline(input_value, system_prompt_input_value,
+                                             state_value["history"], models, candidate_strategy,
+                                             artifact=current_artifact, project_id=state_value["project_id"],
+                                             session_id=session_id, cancel_event=ticket.cancel_event, reuse=reuse,
+                                             budget_scale=plan["budget_scale"]):
+                    if event["type"] == "cache_hit":
+                        gr.Info(f"♻️ Reusing a design for a similar prompt ({event['similarity']:.0%} match)")
+
+                    elif event["type"] == "fallback":
+                        yield {
+                            output: gr.update(value=f"↩️ {event['reason']}, regenerating the full file..."),
+                            output_loading: gr.update(spinning=True),
+                        }
+
+                    elif event["type"] == "repairing":
+                        yield {
+                            output: gr.update(value="🛠️ Fixing problems found in the generated code...\n\n"
+                                                    + "\n".join(f"- {problem}" for problem in event["problems"])),
+                            output_loading: gr.update(spinning=True),
+                        }
+
+                    elif event["type"] == "progress":
+                        progress[event["candidate"]] = f"- Candidate {event['candidate'] + 1} ({event['model']}): {len(event['response'])} chars"
+                        yield {
+                            output: gr.update(value=f"🏁 Generating {len(models)} candidates in parallel...\n\n"
+                                                    + "\n".join(progress[i] for i in sorted(progress))),
+                            output_loading: gr.update(spinning=False),
+                        }
+
+                    elif event["type"] == "delta":
+                        yield {
+                            output: gr.update(value=event["response"]),
+                            output_loading: gr.update(spinning=False),
+                        }
+
+                    elif event["finish_reason"] in FINISHED_REASONS:
+                        if len(models) > 1 and "candidate" in event:
+                            gr.Info(f"Picked candidate {event['candidate'] + 1} ({event['model']})")
+                        state_value["history"] = event["history"]
+                        artifact = event["artifact"]
+                        code_to_download = artifact["code"]
+
+                        if event["finish_reason"] == 'length':
+                            gr.Warning("The response hit the output limit and may be incomplete.")
+                        if event["problems"]:
+                            gr.Warning("Generated code may not render correctly: " + "; ".join(event["problems"])
+                                       + (" (automatic repair failed)" if event.get("repair_error") else ""))
+                        if not is_renderable(event["response"]):
+                            # nothing renderable, keep the answer in the code drawer instead of the sandbox
+                            yield {
+                                output: gr.update(value=event["response"]),
+                                output_loading: gr.update(spinning=False),
+                                state_tab: gr.update(active_key="empty"),
+                                state: gr.update(value=state_value),
+                            }
+                            continue
+
+                        state_value["artifact"] = {"template": artifact["template"], "code": artifact["code"]}
+                        yield {
+                            output: gr.update(value=event["response"]),
+                            download_content: gr.update(value=code_to_download),
+                            state_tab: gr.update(active_key="render"),
+                            output_loading: gr.update(spinning=False),
+                            sandbox: gr.update(
+                                template=artifact["template"],
+                                imports=resolve_react_imports(request_base_url(request))
+                                if artifact["template"] == "react" else {},
+                                value=artifact["files"]
+                            ),
+                            state: gr.update(value=state_value),
+                            suggestions_container: gr.update(visible=True),
+                            download_btn: gr.update(disabled=False if code_to_download else True)
+                        }
+                        rendered_artifact = artifact
+            finally:
+                scheduler.release(ticket)
+
+            # bundling can take minutes, so the snapshot is built after the generation slot is released
+            snapshot_url = build_snapshot(rendered_artifact) if rendered_artifact else None
+            if snapshot_url:
+                yield {
+                    snapshot_btn: gr.update(href=request_base_url(request) + snapshot_url, disabled=False)
+                }
+
         except Exception as e:
-            error_type = type(e).__name__
-            error_message = str(e)
-            
-            if "authentication" in error_message.lower() or "api key" in error_message.lower():
-                friendly_message = "🔐 **Authentication Error**: Invalid API key. Please check your Groq API key."
-            elif "rate limit" in error_message.lower():
-                friendly_message = "⏱️ **Rate Limit**: Too many requests. Please wait a moment and try again."
-            elif "timeout" in error_message.lower():
-                friendly_message = "⏰ **Timeout Error**: The request took too long. Please try again with a simpler prompt."
-            elif "model" in error_message.lower():
-                friendly_message = f"🤖 **Model Error**: Issue with model '{selected_model}'. Try selecting a different model."
-            else:
-                friendly_message = f"❌ **Error ({error_type})**: {error_message}"
-            
             yield {
-                output: gr.update(value=friendly_message),
+                output: gr.update(value=format_error(e, selected_model)),
                 output_loading: gr.update(spinning=False),
                 state_tab: gr.update(active_key="loading"),
                 suggestions_container: gr.update(visible=False),
@@ -317,6 +1986,9 @@ export default Demo
     @staticmethod
     def new_project(state_value):
         state_value["history"] = []
+        state_value["artifact"] = None
+        # previous generations stay in the store under the old project id
+        state_value["project_id"] = None
         return [
             gr.update(value=state_value),
             gr.update(value=""),
@@ -326,6 +1998,7 @@ export default Demo
             gr.update(disabled=True),
             gr.update(value=""), 
             gr.update(value=""),  
+            gr.update(disabled=True),
         ]
 
     @staticmethod
@@ -373,12 +2046,59 @@ export default Demo
         return gr.update(value=state_value.get("system_prompt", SYSTEM_PROMPT))
 
     @staticmethod
-    def render_history(state_value):
-        return gr.update(value=state_value["history"])
+    def render_history_page(state_value, history_view):
+        turns, older = list_history_turns(state_value, history_view["cursors"][-1])
+        messages = []
+        message_ids = []
+        for turn in reversed(turns):
+            response = load_turn_response(turn)
+            if turn["id"] != history_view["expanded"]:
+                response = collapse_code(response)
+            messages += [{'role': "user", 'content': turn["prompt"]}, {'role': "assistant", 'content': response}]
+            message_ids += [turn["id"], turn["id"]]
+        history_view["older"] = older
+        history_view["message_ids"] = message_ids
+        return [
+            gr.update(value=messages),
+            gr.update(value=history_view),
+            gr.update(value=f"Page {len(history_view['cursors'])}" if messages else "No history yet"),
+            gr.update(disabled=older is None),
+            gr.update(disabled=len(history_view["cursors"]) == 1),
+        ]
+
+    @staticmethod
+    def render_history(state_value, history_view):
+        history_view.update(cursors=[None], expanded=None)
+        return GradioEvents.render_history_page(state_value, history_view)
+
+    @staticmethod
+    def older_history(state_value, history_view):
+        if history_view.get("older") is not None:
+            history_view["cursors"].append(history_view["older"])
+        history_view["expanded"] = None
+        return GradioEvents.render_history_page(state_value, history_view)
+
+    @staticmethod
+    def newer_history(state_value, history_view):
+        if len(history_view["cursors"]) > 1:
+            history_view["cursors"].pop()
+        history_view["expanded"] = None
+        return GradioEvents.render_history_page(state_value, history_view)
+
+    @staticmethod
+    def expand_history_message(state_value, history_view, evt: gr.SelectData):
+        message_ids = history_view.get("message_ids") or []
+        index = evt.index[0] if isinstance(evt.index, (list, tuple)) else evt.index
+        if index is not None and 0 <= index < len(message_ids):
+            turn_id = message_ids[index]
+            history_view["expanded"] = None if history_view["expanded"] == turn_id else turn_id
+        return GradioEvents.render_history_page(state_value, history_view)
 
     @staticmethod
     def clear_history(state_value):
         state_value["history"] = []
+        state_value["artifact"] = None
+        state_value["project_id"] = None
         gr.Success("History cleared successfully!")
         return gr.update(value=state_value)
     
@@ -490,7 +2210,8 @@ theme = gr.themes.Default()
 
 with gr.Blocks(title="Groq AI WebDev Coder", theme=theme, css=css) as demo:
     # global state
-    state = gr.State({"system_prompt": SYSTEM_PROMPT, "history": []})
+    state = gr.State({"system_prompt": SYSTEM_PROMPT, "history": [], "artifact": None, "project_id": None})
+    history_view = gr.State({"cursors": [None], "expanded": None, "older": None, "message_ids": []})
     
     with ms.Application(elem_id="coder-artifacts") as app:
         with antd.ConfigProvider(theme=DEFAULT_THEME, locale=DEFAULT_LOCALE):
@@ -547,6 +2268,41 @@ with gr.Blocks(title="Groq AI WebDev Coder", theme=theme, css=css) as demo:
                                     f"📊 {default_model_desc} | Max tokens: {default_model_tokens}",
                                     type="secondary",
                                     elem_style=dict(fontSize=12, display="block", marginTop=8))
+
+                                # parallel candidates
+                                with antd.Flex(gap="small", wrap=True, align="center",
+                                               elem_style=dict(marginTop=8)):
+                                    candidate_count = antd.Select(
+                                        default_value=1,
+                                        size="small",
+                                        options=[
+                                            {
+                                                "label": "1 candidate" if n == 1 else f"{n} candidates",
+                                                "value": n,
+                                            }
+                                            for n in range(1, MAX_CANDIDATES + 1)
+                                        ]
+                                    )
+                                    candidate_strategy = antd.Select(
+                                        default_value="fastest",
+                                        size="small",
+                                        options=CANDIDATE_STRATEGIES
+                                    )
+                                    mix_models = antd.Switch(
+                                        value=False,
+                                        size="small",
+                                        checked_children="Mix models",
+                                        un_checked_children="Same model")
+                                    edit_mode = antd.Switch(
+                                        value=True,
+                                        size="small",
+                                        checked_children="⚡ Quick edits",
+                                        un_checked_children="Full rewrites")
+                                    reuse_designs = antd.Switch(
+                                        value=False,
+                                        size="small",
+                                        checked_children="♻️ Reuse similar designs",
+                                        un_checked_children="Always generate")
                                 
                             input = antd.Input.Textarea(
                                 size="large",
@@ -633,6 +2389,13 @@ with gr.Blocks(title="Groq AI WebDev Coder", theme=theme, css=css) as demo:
                                         size="small",
                                         disabled=True
                                     )
+                                    snapshot_btn = antd.Button(
+                                        "🔗 Snapshot",
+                                        type="default",
+                                        size="small",
+                                        href_target="_blank",
+                                        disabled=True
+                                    )
                                     view_code_btn = antd.Button(
                                         "👨‍💻 View Code", 
                                         type="primary",
@@ -763,8 +2526,21 @@ with gr.Blocks(title="Groq AI WebDev Coder", theme=theme, css=css) as demo:
                             "() => document.querySelector('.gradio-container')",
                             width="750px") as history_drawer:
                         antd.Typography.Paragraph(
-                            "Review your conversation history with the AI:",
+                            "Review your conversation history with the AI (click a response to show its full code):",
                             elem_style=dict(marginBottom=12))
+                        with antd.Flex(justify="space-between", align="center",
+                                       elem_style=dict(marginBottom=12)):
+                            history_older_btn = antd.Button(
+                                "⬅️ Older",
+                                size="small",
+                                disabled=True)
+                            history_page_label = antd.Typography.Text(
+                                "",
+                                type="secondary")
+                            history_newer_btn = antd.Button(
+                                "Newer ➡️",
+                                size="small",
+                                disabled=True)
                         history_output = gr.Chatbot(
                             show_label=False,
                             type="messages",
@@ -819,7 +2595,8 @@ with gr.Blocks(title="Groq AI WebDev Coder", theme=theme, css=css) as demo:
     new_project_modal.ok(
         fn=GradioEvents.new_project,
         inputs=[state],
-        outputs=[state, input, state_tab, sandbox, suggestions_container, download_btn, output, download_content]
+        outputs=[state, input, state_tab, sandbox, suggestions_container, download_btn, output, download_content,
+                 snapshot_btn]
     ).then(
         fn=lambda: gr.Info("✨ New project started! Previous conversation cleared."),
         outputs=[]
@@ -872,13 +2649,30 @@ with gr.Blocks(title="Groq AI WebDev Coder", theme=theme, css=css) as demo:
         inputs=[state],
         outputs=[state])
     
+    history_page_outputs = [history_output, history_view, history_page_label, history_older_btn, history_newer_btn]
+
     history_btn.click(
         fn=GradioEvents.open_modal,
         outputs=[history_drawer]
     ).then(
         fn=GradioEvents.render_history,
-        inputs=[state],
-        outputs=[history_output])
+        inputs=[state, history_view],
+        outputs=history_page_outputs)
+
+    history_older_btn.click(
+        fn=GradioEvents.older_history,
+        inputs=[state, history_view],
+        outputs=history_page_outputs)
+
+    history_newer_btn.click(
+        fn=GradioEvents.newer_history,
+        inputs=[state, history_view],
+        outputs=history_page_outputs)
+
+    history_output.select(
+        fn=GradioEvents.expand_history_message,
+        inputs=[state, history_view],
+        outputs=history_page_outputs)
     
     history_drawer.close(
         fn=GradioEvents.close_modal, 
@@ -900,30 +2694,381 @@ with gr.Blocks(title="Groq AI WebDev Coder", theme=theme, css=css) as demo:
         fn=GradioEvents.open_modal,
         outputs=[output_code_drawer],
     ).then(
-        fn=GradioEvents.disable_btns([submit_btn, download_btn]),
-        outputs=[submit_btn, download_btn]
+        fn=GradioEvents.disable_btns([download_btn]),
+        outputs=[download_btn]
     ).then(
         fn=GradioEvents.generate_code,
-        inputs=[input, system_prompt_input, state, model_selector],
+        inputs=[input, system_prompt_input, state, model_selector,
+                candidate_count, candidate_strategy, mix_models, edit_mode, reuse_designs],
         outputs=[
             output, state_tab, sandbox, download_content,
-            output_loading, state, suggestions_container, download_btn
+            output_loading, state, suggestions_container, download_btn, snapshot_btn
         ]
     ).then(
         fn=GradioEvents.enable_btns([submit_btn]),
         outputs=[submit_btn]
     )
 
-if __name__ == "__main__":
-    import os
-    port = int(os.environ.get('PORT', 7860))
-    
+# rest api (mounted next to the gradio ui)
+api_app = FastAPI(title="Groq AI WebDev Coder API")
+
+
+class GenerateRequest(BaseModel):
+    prompt: str
+    system_prompt: str | None = None
+    history: list = []
+    model: str = DEFAULT_MODEL
+    candidates: int = 1
+    strategy: str = "fastest"
+    mix_models: bool = False
+    # latest {"template", "code"}; when set the prompt is applied as a patch to it
+    artifact: dict | None = None
+    snapshot: bool = False
+    # persist the result under this project (see /api/projects/{project_id}/generations)
+    project_id: str | None = None
+    # scheduling key; a newer request with the same session id supersedes the running one
+    session_id: str | None = None
+    # answer from a near-duplicate earlier prompt when there is one (first turns only)
+    use_cache: bool = False
+
+
+def check_generate_request(body):
+    if not body.prompt or not body.prompt.strip():
+        raise HTTPException(status_code=400, detail="Prompt must not be empty")
+    if body.model not in [model["value"] for model in AVAILABLE_MODELS]:
+        raise HTTPException(status_code=400, detail=f"Unknown model '{body.model}'")
+    if body.strategy not in [strategy["value"] for strategy in CANDIDATE_STRATEGIES]:
+        raise HTTPException(status_code=400, detail=f"Unknown strategy '{body.strategy}'")
+
+
+def submit_api_request(body, request):
+    plan = load_shedder.plan(body.prompt, body.system_prompt, body.history, body.artifact,
+                             body.model, body.candidates, body.use_cache)
+    if plan["busy"]:
+        raise HTTPException(status_code=503, detail=f"Busy, estimated wait {plan['estimated_wait']}s",
+                            headers={"Retry-After": str(plan["estimated_wait"])})
+    # only an explicit session id supersedes; otherwise requests from one host (or one proxy)
+    # run side by side and the address is just the fairness key
+    session_id = body.session_id or request.headers.get("x-session-id")
+    fairness_key = session_id or f"ip:{request.client.host if request.client else 'unknown'}"
+    kind = plan["kind"]
+    weight = max(1, min(plan["candidates"], MAX_CANDIDATES)) if kind == "generate" else 1
+    return scheduler.submit(fairness_key, kind, weight, supersede=bool(session_id)), plan
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@api_app.post("/api/generate")
+def api_generate(body: GenerateRequest, request: Request):
+    check_generate_request(body)
+    ticket, plan = submit_api_request(body, request)
+    try:
+        if not ticket.wait():
+            raise HTTPException(status_code=409, detail="Superseded by a newer request from the same session")
+        result = generate(body.prompt, body.system_prompt, body.history, plan["model"],
+                          plan["candidates"], body.strategy, body.mix_models, body.artifact, body.project_id,
+                          body.session_id, ticket.cancel_event, reuse=plan["reuse"],
+                          budget_scale=plan["budget_scale"])
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=format_error(e, body.model))
+    finally:
+        scheduler.release(ticket)
+    if result is None or result["finish_reason"] == "cancelled":
+        raise HTTPException(status_code=409, detail="Superseded by a newer request from the same session")
+    result["load_level"] = plan["level"]
+    result["artifact"] = with_imports(result["artifact"], resolve_react_imports(request_base_url(request)))
+    if body.snapshot:
+        result["snapshot"] = build_snapshot(result["artifact"])
+    return result
+
+
+@api_app.post("/api/generate/stream")
+def api_generate_stream(body: GenerateRequest, request: Request):
+    check_generate_request(body)
+    ticket, plan = submit_api_request(body, request)
+    imports = resolve_react_imports(request_base_url(request))
+
+    def events():
+        try:
+            while not ticket.wait(1.0):
+                if ticket.superseded:
+                    yield format_sse("superseded", {})
+                    return
+                yield format_sse("queued", {"position": scheduler.position(ticket)})
+            models = candidate_models(plan["model"], plan["candidates"], body.mix_models)
+            for event in stream_pipeline(body.prompt, body.system_prompt, body.history,
+                                         models, body.strategy, artifact=body.artifact,
+                                         project_id=body.project_id, session_id=body.session_id,
+                                         cancel_event=ticket.cancel_event, reuse=plan["reuse"],
+                                         budget_scale=plan["budget_scale"]):
+                if event["type"] == "cache_hit":
+                    yield format_sse("cache_hit", {key: value for key, value in event.items() if key != "type"})
+                elif event["type"] == "fallback":
+                    yield format_sse("fallback", {"reason": event["reason"]})
+                elif event["type"] == "repairing":
+                    yield format_sse("repairing", {"problems": event["problems"]})
+                elif event["type"] == "delta":
+                    yield format_sse("delta", {"content": event["content"]})
+                elif event["type"] == "progress":
+                    yield format_sse("progress", {"candidate": event["candidate"], "model": event["model"],
+                                                  "chars": len(event["response"])})
+                else:
+                    event["load_level"] = plan["level"]
+                    event["artifact"] = with_imports(event["artifact"], imports)
+                    if body.snapshot and event["finish_reason"] in FINISHED_REASONS:
+                        # the generation is over; don't hold its slot while bundling
+                        scheduler.release(ticket)
+                        event["snapshot"] = build_snapshot(event["artifact"])
+                    yield format_sse("done", event)
+            if ticket.superseded:
+                yield format_sse("superseded", {})
+        except Exception as e:
+            yield format_sse("error", {"detail": format_error(e, body.model)})
+        finally:
+            scheduler.release(ticket)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@api_app.get("/api/metrics")
+def api_metrics():
+    return {
+        "scheduler": scheduler.stats(),
+        "completion_budgets": completion_budget.stats(),
+        "prompt_cache": prompt_index.stats() if prompt_index is not None else None,
+        "load_shedding": load_shedder.stats(),
+    }
+
+
+@api_app.get(VENDOR_ROUTE + "/{name:path}")
+def vendor_module(name):
+    path = vendor_file_path(name)
+    if not path or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Module not vendored")
+    media_type = mimetypes.guess_type(name)[0]
+    if not media_type or media_type == "text/plain":
+        media_type = "text/javascript"
+    return FileResponse(path, media_type=media_type, headers={
+        # vendored files are pinned, a new build changes their urls
+        "Cache-Control": "public, max-age=31536000, immutable",
+        # the sandbox iframe may run on an opaque origin
+        "Access-Control-Allow-Origin": "*",
+    })
+
+
+@api_app.get(SNAPSHOT_ROUTE + "/{digest}/{name:path}")
+def snapshot_file(digest, name):
+    name = name or "index.html"
+    if not re.fullmatch(r"[0-9a-f]{64}", digest) or name not in SNAPSHOT_FILES:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    path = os.path.join(SNAPSHOT_DIR, digest, name)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return FileResponse(path, media_type=SNAPSHOT_FILES[name], headers={
+        # snapshots are addressed by the hash of their source and never change
+        "Cache-Control": "public, max-age=31536000, immutable",
+        # generated code runs on an opaque origin, isolated from the app like in the sandbox iframe
+        "Content-Security-Policy": "sandbox allow-scripts allow-forms allow-modals allow-popups",
+        # the opaque-origin page loads its module script and styles cross-origin
+        "Access-Control-Allow-Origin": "*",
+        "X-Content-Type-Options": "nosniff",
+    })
+
+
+@api_app.get("/api/projects/{project_id}/generations")
+def api_project_generations(project_id, limit: int = HISTORY_PAGE_SIZE, before: int | None = None):
+    if artifact_store is None:
+        raise HTTPException(status_code=404, detail="Artifact store is disabled")
+    limit = max(1, min(limit, 100))
+    generations = artifact_store.list_generations(project_id, limit, before)
+    return {
+        "generations": generations,
+        "next_before": generations[-1]["id"] if len(generations) == limit else None,
+    }
+
+
+@api_app.get("/api/sessions/{session_id}/generations")
+def api_session_generations(session_id, limit: int = HISTORY_PAGE_SIZE, before: int | None = None):
+    if artifact_store is None:
+        raise HTTPException(status_code=404, detail="Artifact store is disabled")
+    limit = max(1, min(limit, 100))
+    generations = artifact_store.list_generations(session_id=session_id, limit=limit, before_id=before)
+    return {
+        "generations": generations,
+        "next_before": generations[-1]["id"] if len(generations) == limit else None,
+    }
+
+
+@api_app.get("/api/blobs/{digest}")
+def api_blob(digest):
+    # raw responses referenced by response_blob in the generation listings
+    if artifact_store is None or not re.fullmatch(r"[0-9a-f]{64}", digest):
+        raise HTTPException(status_code=404, detail="Blob not found")
+    try:
+        content = artifact_store.get_blob(digest)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    return PlainTextResponse(content, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+
+@api_app.get("/api/artifacts/{digest}")
+def api_artifact(digest):
+    artifact = artifact_store.get_artifact(digest) if artifact_store is not None else None
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return artifact
+
+
+# batch mode: python app.py batch prompts.jsonl -o results.jsonl
+def read_batch_jobs(input_path):
+    jobs = []
+    with open(input_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            # a malformed line becomes a failed job instead of aborting the run
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                job = {"error": f"invalid JSON: {e}"}
+            if isinstance(job, str):
+                job = {"prompt": job}
+            elif not isinstance(job, dict):
+                job = {"error": f"expected an object or a string, got {type(job).__name__}"}
+            job.setdefault("id", str(line_number))
+            job.setdefault("project_id", f"batch:{os.path.basename(input_path)}")
+            jobs.append(job)
+    return jobs
+
+
+def read_completed_ids(output_path):
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            # skips lines left half-written by an interrupted run
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(result, dict) and "id" in result and not result.get("error"):
+                completed.add(str(result["id"]))
+    return completed
+
+
+def run_batch_job(job, default_model, default_system_prompt, snapshot=False):
+    model = job.get("model") or default_model
+    result = {"id": job.get("id"), "prompt": job.get("prompt"), "model": model}
+    started_at = time.time()
+    try:
+        # a bad line fails on its own instead of stopping the whole batch
+        if job.get("error"):
+            raise ValueError(job["error"])
+        if not isinstance(job.get("prompt"), str) or not job["prompt"].strip():
+            raise ValueError("job has no prompt")
+        done = generate(job["prompt"], job.get("system_prompt") or default_system_prompt, model=model,
+                        candidates=job.get("candidates", 1), strategy=job.get("strategy", "fastest"),
+                        mix_models=job.get("mix_models", False), project_id=job.get("project_id"),
+                        use_cache=job.get("use_cache", False))
+        if done is None:
+            raise RuntimeError("no candidate produced a result")
+        result.update({
+            "finish_reason": done["finish_reason"],
+            "template": done["artifact"]["template"],
+            "code": done["artifact"]["code"],
+            # results are used away from this server, so they keep the public esm.sh urls
+            "imports": with_imports(done["artifact"], react_imports)["imports"],
+            "response": done["response"],
+            "generation_id": done.get("generation_id"),
+        })
+        if done.get("cached"):
+            result["cached"] = done["cached"]
+        if snapshot:
+            result["snapshot"] = build_snapshot(done["artifact"])
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["duration"] = round(time.time() - started_at, 3)
+    return result
+
+
+def run_batch(input_path, output_path, concurrency=4, model=DEFAULT_MODEL, system_prompt=None, snapshot=False):
+    completed = read_completed_ids(output_path)
+    jobs = [job for job in read_batch_jobs(input_path) if str(job["id"]) not in completed]
+    print(f"Generating {len(jobs)} prompts ({len(completed)} already done) with concurrency {concurrency}")
+
+    # a killed run can leave a half-written last line; new results must not be appended to it
+    truncated = False
+    if os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            truncated = f.read(1) != b"\n"
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool, \
+            open(output_path, "a", encoding="utf-8") as out:
+        if truncated:
+            out.write("\n")
+        futures = [pool.submit(run_batch_job, job, model, system_prompt, snapshot) for job in jobs]
+        for index, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            if result.get("error"):
+                failed += 1
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            print(f"[{index}/{len(jobs)}] {result['id']}: {result.get('error') or 'ok'} ({result['duration']}s)")
+    return failed
+
+
+def launch(port):
     demo.queue(
         default_concurrency_limit=100,
         max_size=100
-    ).launch(
-        server_name="0.0.0.0",
-        server_port=port,
-        ssr_mode=False,
-        max_threads=100
     )
+    demo.max_threads = 100
+    app = gr.mount_gradio_app(api_app, demo, path="/", ssr_mode=False)
+    uvicorn.run(app, host="0.0.0.0", port=port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Groq AI WebDev Coder")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("serve", help="run the web UI and REST API (default)")
+    batch_parser = subparsers.add_parser("batch", help="generate a JSONL file of prompts without the UI")
+    batch_parser.add_argument("input", help="JSONL file, one {\"prompt\": ...} object per line")
+    batch_parser.add_argument("-o", "--output", default="results.jsonl",
+                              help="JSONL results file; ids already in it are skipped")
+    batch_parser.add_argument("-c", "--concurrency", type=int, default=4)
+    batch_parser.add_argument("-m", "--model", default=DEFAULT_MODEL,
+                              choices=[model["value"] for model in AVAILABLE_MODELS])
+    batch_parser.add_argument("--system-prompt-file", help="override the default system prompt")
+    batch_parser.add_argument("--snapshot", action="store_true", help="also build a static snapshot per result")
+    # the server only reads VENDOR_DIR, so the target directory is set through the same variable
+    subparsers.add_parser("vendor", help="download react_imports from esm.sh into VENDOR_DIR for local serving")
+    args = parser.parse_args(argv)
+
+    if args.command == "vendor":
+        manifest = vendor_esm_modules()
+        print(f"Vendored {manifest['modules']} modules into {VENDOR_DIR}")
+        return 0
+
+    if args.command == "batch":
+        system_prompt = None
+        if args.system_prompt_file:
+            with open(args.system_prompt_file, encoding="utf-8") as f:
+                system_prompt = f.read()
+        failed = run_batch(args.input, args.output, max(1, args.concurrency), args.model, system_prompt,
+                           args.snapshot)
+        return 1 if failed else 0
+
+    launch(int(os.environ.get('PORT', 7860)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
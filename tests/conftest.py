@@ -0,0 +1,13 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("STORE", "0")
+
+try:
+    # app.py builds the whole UI at import time
+    import gradio  # noqa: F401
+    import modelscope_studio  # noqa: F401
+except ImportError:
+    collect_ignore_glob = ["test_*.py"]
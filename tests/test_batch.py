@@ -0,0 +1,74 @@
+import json
+
+import app
+
+
+def fake_generate(prompt, system_prompt=None, **kwargs):
+    response = f"```html\n<p>{prompt}</p>\n```"
+    return {"finish_reason": "stop", "response": response, "artifact": app.package_artifact(response)}
+
+
+def test_batch_survives_a_job_without_prompt(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "generate", fake_generate)
+    jobs = tmp_path / "jobs.jsonl"
+    jobs.write_text('{"id": "a", "prompt": "a pricing page"}\n{"id": "b"}\n"a landing page"\n', encoding="utf-8")
+    output = tmp_path / "results.jsonl"
+
+    failed = app.run_batch(str(jobs), str(output), concurrency=2)
+
+    results = {result["id"]: result for result in map(json.loads, output.read_text(encoding="utf-8").splitlines())}
+    assert failed == 1
+    assert results["b"]["error"] == "ValueError: job has no prompt"
+    assert results["a"]["code"] == "<p>a pricing page</p>"
+    assert results["3"]["code"] == "<p>a landing page</p>"
+
+
+def test_completed_ids_skip_failed_jobs(tmp_path):
+    output = tmp_path / "results.jsonl"
+    output.write_text('{"id": "a"}\n{"id": "b", "error": "boom"}\n', encoding="utf-8")
+    assert app.read_completed_ids(str(output)) == {"a"}
+
+
+def test_batch_survives_malformed_input_lines(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "generate", fake_generate)
+    jobs = tmp_path / "jobs.jsonl"
+    jobs.write_text('{"id": "a", "prompt": "a pricing page"}\n{"prompt": \n[1, 2]\n', encoding="utf-8")
+    output = tmp_path / "results.jsonl"
+
+    failed = app.run_batch(str(jobs), str(output))
+
+    results = {result["id"]: result for result in map(json.loads, output.read_text(encoding="utf-8").splitlines())}
+    assert failed == 2
+    assert results["a"]["code"] == "<p>a pricing page</p>"
+    assert results["2"]["error"].startswith("ValueError: invalid JSON")
+    assert results["3"]["error"] == "ValueError: expected an object or a string, got list"
+
+
+def test_resume_after_a_half_written_result(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "generate", fake_generate)
+    jobs = tmp_path / "jobs.jsonl"
+    jobs.write_text('{"id": "a", "prompt": "a pricing page"}\n{"id": "b", "prompt": "a blog"}\n', encoding="utf-8")
+    output = tmp_path / "results.jsonl"
+    output.write_text('{"id": "a", "code": "<p>a pricing page</p>"}\n{"id": "b", "co', encoding="utf-8")
+
+    assert app.read_completed_ids(str(output)) == {"a"}
+    assert app.run_batch(str(jobs), str(output)) == 0
+
+    lines = output.read_text(encoding="utf-8").splitlines()
+    assert lines[1] == '{"id": "b", "co'
+    assert json.loads(lines[2])["id"] == "b"
+
+
+def test_batch_results_keep_public_imports(tmp_path, monkeypatch):
+    # a vendor build maps imports to this server, which batch results must not depend on
+    manifest = {"imports": {key: f"/vendor/esm/build/{key}" for key in app.react_imports}}
+    monkeypatch.setattr(app, "_vendor_manifest", manifest)
+    response = "```jsx\nexport default function App() {\n  return <p>Hi</p>;\n}\n```"
+    monkeypatch.setattr(app, "generate", lambda prompt, system_prompt=None, **kwargs: {
+        "finish_reason": "stop", "response": response, "artifact": app.package_artifact(response)})
+    assert app.resolve_react_imports("https://coder.example")["react"] == "https://coder.example/vendor/esm/build/react"
+
+    result = app.run_batch_job({"id": "a", "prompt": "a greeting"}, app.DEFAULT_MODEL, None)
+
+    assert result["template"] == "react"
+    assert result["imports"] == app.react_imports
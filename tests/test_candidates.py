@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+import app
+
+VALID = "```html\n<p>valid</p>\n```"
+BROKEN = "```jsx\nexport default function App() {\n  return <div>{items.map(i => (<p>{i}</p>)}</div>;\n}\n```"
+
+
+def fake_generation(script):
+    # script: model -> events to yield; an exception is raised, "wait" blocks until the candidate is cancelled
+    cancelled = {}
+
+    def stream_generation(prompt, system_prompt=None, history=None, model=app.DEFAULT_MODEL, cancel_event=None,
+                          budget_scale=1.0):
+        cancelled[model] = cancel_event
+        for step in script[model]:
+            if isinstance(step, Exception):
+                raise step
+            if step == "wait":
+                cancel_event.wait(5)
+                step = done(model, "", "cancelled")
+            yield step
+    return stream_generation, cancelled
+
+
+def delta(response):
+    return {"type": "delta", "content": response, "response": response}
+
+
+def done(model, response, finish_reason="stop"):
+    return {"type": "done", "model": model, "finish_reason": finish_reason, "response": response}
+
+
+def test_error_from_the_streaming_winner_is_raised(monkeypatch):
+    stream_generation, _ = fake_generation({
+        "a": [delta("```html\n"), RuntimeError("connection reset")],
+        "b": ["wait"],
+    })
+    monkeypatch.setattr(app, "stream_generation", stream_generation)
+    events = app.stream_candidates("a page", models=("a", "b"))
+    assert next(events)["candidate"] == 0
+    with pytest.raises(RuntimeError, match="connection reset"):
+        list(events)
+
+
+def test_first_error_is_raised_when_every_candidate_fails(monkeypatch):
+    stream_generation, _ = fake_generation({"a": [RuntimeError("rate limited")],
+                                            "b": [RuntimeError("rate limited")]})
+    monkeypatch.setattr(app, "stream_generation", stream_generation)
+    with pytest.raises(RuntimeError, match="rate limited"):
+        list(app.stream_candidates("a page", models=("a", "b")))
+
+
+def test_failed_candidate_does_not_stop_the_others(monkeypatch):
+    stream_generation, _ = fake_generation({"a": [RuntimeError("rate limited")],
+                                            "b": [delta(VALID), done("b", VALID)]})
+    monkeypatch.setattr(app, "stream_generation", stream_generation)
+    final = list(app.stream_candidates("a page", models=("a", "b")))[-1]
+    assert (final["model"], final["candidate"]) == ("b", 1)
+
+
+def test_first_valid_falls_back_to_a_finished_candidate(monkeypatch):
+    stream_generation, _ = fake_generation({"a": [delta(BROKEN), done("a", BROKEN)],
+                                            "b": [done("b", BROKEN)]})
+    monkeypatch.setattr(app, "stream_generation", stream_generation)
+    events = list(app.stream_candidates("a page", models=("a", "b"), strategy="first_valid"))
+    assert events[-1]["type"] == "done"
+    assert events[-1]["response"] == BROKEN
+    assert all(event["type"] == "progress" for event in events[:-1])
+
+
+def test_first_valid_picks_the_valid_candidate(monkeypatch):
+    stream_generation, cancelled = fake_generation({"a": [done("a", BROKEN)],
+                                                    "b": [done("b", VALID)],
+                                                    "c": ["wait"]})
+    monkeypatch.setattr(app, "stream_generation", stream_generation)
+    final = list(app.stream_candidates("a page", models=("a", "b", "c"), strategy="first_valid"))[-1]
+    assert final["model"] == "b"
+    assert cancelled["c"].is_set()
+
+
+def test_outer_cancel_stops_every_candidate(monkeypatch):
+    stream_generation, cancelled = fake_generation({"a": ["wait"], "b": ["wait"]})
+    monkeypatch.setattr(app, "stream_generation", stream_generation)
+    cancel_event = threading.Event()
+    cancel_event.set()
+    assert list(app.stream_candidates("a page", models=("a", "b"), cancel_event=cancel_event)) == []
+    assert cancelled["a"].is_set() and cancelled["b"].is_set()
@@ -0,0 +1,98 @@
+from types import SimpleNamespace
+
+import app
+
+
+class FakeStream(list):
+
+    def close(self):
+        pass
+
+
+def fake_stream(text, finish_reason, completion_tokens):
+    chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece), finish_reason=None)],
+                              x_groq=None)
+              for piece in text]
+    chunks.append(SimpleNamespace(
+        choices=[SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason=finish_reason)],
+        x_groq=SimpleNamespace(usage=SimpleNamespace(prompt_tokens=100, completion_tokens=completion_tokens))))
+    return FakeStream(chunks)
+
+
+class FakeClient:
+
+    def __init__(self, *streams):
+        self.streams = list(streams)
+        self.requests = []
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return self.streams.pop(0)
+
+
+def test_cut_off_responses_are_continued_and_stitched(monkeypatch):
+    client = FakeClient(
+        fake_stream(["```html\n<ul>\n", "  <li>one</li>\n"], "length", 40),
+        # the continuation reopens the fence, which must not end up in the response
+        fake_stream(["```html\n", "  <li>two</li>\n</ul>\n```"], "stop", 25),
+    )
+    monkeypatch.setattr(app, "client", client)
+    monkeypatch.setattr(app, "completion_budget", app.CompletionBudget())
+
+    events = list(app.stream_completion([{"role": "user", "content": "a list"}], kind="generate:html"))
+
+    done = events[-1]
+    assert done["response"] == "```html\n<ul>\n  <li>one</li>\n  <li>two</li>\n</ul>\n```"
+    assert "".join(event["content"] for event in events[:-1]) == done["response"]
+    assert (done["finish_reason"], done["continuations"]) == ("stop", 1)
+    assert done["usage"] == {"prompt_tokens": 200, "completion_tokens": 65}
+    continuation = client.requests[1]["messages"]
+    assert continuation[-2] == {"role": "assistant", "content": "```html\n<ul>\n  <li>one</li>\n"}
+    assert continuation[-1]["content"] == app.CONTINUE_PROMPT
+
+
+def test_continuation_keeps_a_fence_that_is_not_reopened(monkeypatch):
+    client = FakeClient(fake_stream(["```html\n<p>one"], "length", 40),
+                        fake_stream(["</p>\n<p>two</p>\n```"], "stop", 10))
+    monkeypatch.setattr(app, "client", client)
+    monkeypatch.setattr(app, "completion_budget", app.CompletionBudget())
+    done = list(app.stream_completion([{"role": "user", "content": "two lines"}], kind="generate:html"))[-1]
+    assert done["response"] == "```html\n<p>one</p>\n<p>two</p>\n```"
+
+
+def test_continuations_stop_at_the_limit(monkeypatch):
+    client = FakeClient(*[fake_stream([f"part {i}\n"], "length", 10) for i in range(app.MAX_CONTINUATIONS + 1)])
+    monkeypatch.setattr(app, "client", client)
+    monkeypatch.setattr(app, "completion_budget", app.CompletionBudget())
+    done = list(app.stream_completion([{"role": "user", "content": "a long page"}]))[-1]
+    assert (done["finish_reason"], done["continuations"]) == ("length", app.MAX_CONTINUATIONS)
+    assert len(client.requests) == app.MAX_CONTINUATIONS + 1
+
+
+def test_reduced_budget_is_not_continued_or_observed(monkeypatch):
+    budget = app.CompletionBudget()
+    client = FakeClient(fake_stream(["```html\n<p>cut"], "length", 300))
+    monkeypatch.setattr(app, "client", client)
+    monkeypatch.setattr(app, "completion_budget", budget)
+
+    done = list(app.stream_completion([{"role": "user", "content": "a page"}], kind="generate:html",
+                                      budget_scale=0.5))[-1]
+
+    assert (done["finish_reason"], done["continuations"]) == ("length", 0)
+    assert client.requests[0]["max_completion_tokens"] == app.BUDGET_DEFAULTS["generate:html"] // 2
+    assert budget.stats() == {}
+
+
+def test_budget_estimate_follows_observed_p90():
+    budget = app.CompletionBudget()
+    assert budget.estimate(app.DEFAULT_MODEL, "refine") == app.BUDGET_DEFAULTS["refine"]
+    for tokens in range(100, 1100, 100):
+        budget.observe(app.DEFAULT_MODEL, "refine", tokens)
+    # p90 of 100..1000 is 900
+    assert budget.estimate(app.DEFAULT_MODEL, "refine") == int(900 * app.BUDGET_HEADROOM)
+    assert budget.estimate(app.DEFAULT_MODEL, "refine", scale=0.5) == int(900 * app.BUDGET_HEADROOM * 0.5)
+    # small outputs never shrink the budget below the floor
+    for _ in range(app.BUDGET_MIN_SAMPLES):
+        budget.observe(app.DEFAULT_MODEL, "repair", 10)
+    assert budget.estimate(app.DEFAULT_MODEL, "repair") == app.BUDGET_MIN_TOKENS
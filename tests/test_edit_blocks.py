@@ -0,0 +1,83 @@
+import app
+
+ARTIFACT = {
+    "template": "react",
+    "code": "export default function App() {\n  return (\n    <h1>Hello</h1>\n  );\n}",
+}
+
+PATCH = """<<<<<<< SEARCH
+    <h1>Hello</h1>
+=======
+    <h1>Hello, world</h1>
+>>>>>>> REPLACE"""
+
+
+def fake_completion(response):
+    def stream_completion(messages, model=app.DEFAULT_MODEL, cancel_event=None, temperature=1, kind=None,
+                          budget_scale=1.0):
+        yield {"type": "delta", "content": response, "response": response}
+        yield {"type": "done", "model": model, "finish_reason": "stop", "response": response,
+               "duration": 0.1, "first_token": 0.05, "usage": None, "continuations": 0}
+    return stream_completion
+
+
+def test_parse_edit_blocks():
+    assert app.parse_edit_blocks(PATCH) == [("    <h1>Hello</h1>", "    <h1>Hello, world</h1>")]
+    assert app.parse_edit_blocks("no blocks here") == []
+
+
+def test_parse_edit_blocks_multiple():
+    blocks = app.parse_edit_blocks(PATCH + "\n\n" + PATCH.replace("Hello", "Bye"))
+    assert [search for search, _ in blocks] == ["    <h1>Hello</h1>", "    <h1>Bye</h1>"]
+
+
+def test_apply_edit_blocks():
+    code = app.apply_edit_blocks(ARTIFACT["code"], app.parse_edit_blocks(PATCH))
+    assert "<h1>Hello, world</h1>" in code
+    assert code.startswith("export default function App()")
+
+
+def test_apply_edit_blocks_ignores_indentation():
+    code = app.apply_edit_blocks(ARTIFACT["code"], [("<h1>Hello</h1>", "      <h2>Hi</h2>")])
+    assert "      <h2>Hi</h2>" in code
+    assert "<h1>" not in code
+
+
+def test_apply_edit_blocks_rejects_missing_search():
+    assert app.apply_edit_blocks(ARTIFACT["code"], [("<p>missing</p>", "<p>x</p>")]) is None
+    assert app.apply_edit_blocks(ARTIFACT["code"], []) is None
+
+
+def test_apply_edit_blocks_rejects_ambiguous_search():
+    code = "<ul>\n  <li>Item</li>\n  <li>Item</li>\n</ul>"
+    assert app.apply_edit_blocks(code, [("<li>Item</li>", "<li>First</li>")]) is None
+    # the indentation-insensitive retry must not pick one of several matches either
+    assert app.apply_edit_blocks(code, [("    <li>Item</li>", "<li>First</li>")]) is None
+
+
+def test_stream_edit_falls_back_on_ambiguous_blocks(monkeypatch):
+    artifact = {"template": "html", "code": "<ul>\n  <li>Item</li>\n  <li>Item</li>\n</ul>"}
+    patch = "<<<<<<< SEARCH\n  <li>Item</li>\n=======\n  <li>First</li>\n>>>>>>> REPLACE"
+    completions = iter([patch, "```html\n<ul>\n  <li>First</li>\n  <li>Item</li>\n</ul>\n```"])
+    monkeypatch.setattr(app, "stream_completion", lambda *args, **kwargs: fake_completion(next(completions))(
+        *args, **kwargs))
+    events = list(app.stream_edit("rename the first item", artifact=artifact))
+    assert any(event["type"] == "fallback" for event in events)
+    done = events[-1]
+    assert done["artifact"]["code"] == "<ul>\n  <li>First</li>\n  <li>Item</li>\n</ul>"
+
+
+def test_stream_edit_applies_fenced_blocks(monkeypatch):
+    monkeypatch.setattr(app, "stream_completion", fake_completion(f"```jsx\n{PATCH}\n```"))
+    events = list(app.stream_edit("say hello world", artifact=ARTIFACT))
+    done = events[-1]
+    assert done["type"] == "done"
+    assert "SEARCH" not in done["artifact"]["code"]
+    assert "<h1>Hello, world</h1>" in done["artifact"]["code"]
+
+
+def test_stream_edit_accepts_full_rewrite(monkeypatch):
+    rewrite = "```jsx\nexport default function App() {\n  return <main>New</main>;\n}\n```"
+    monkeypatch.setattr(app, "stream_completion", fake_completion(rewrite))
+    done = list(app.stream_edit("start over", artifact=ARTIFACT))[-1]
+    assert done["artifact"]["code"] == "export default function App() {\n  return <main>New</main>;\n}"
@@ -0,0 +1,36 @@
+import app
+
+
+def conversation(turns):
+    history = []
+    for i in range(turns):
+        history = app.build_messages(f"prompt {i}", None, history) + [{"role": "assistant", "content": f"answer {i}"}]
+    return {"history": history, "project_id": None}
+
+
+def test_turns_skip_system_messages(monkeypatch):
+    monkeypatch.setattr(app, "artifact_store", None)
+    turns, older = app.list_history_turns(conversation(3))
+    assert [(turn["prompt"], turn["response"]) for turn in turns] == [
+        ("prompt 2", "answer 2"), ("prompt 1", "answer 1"), ("prompt 0", "answer 0"),
+    ]
+    assert older is None
+
+
+def test_turns_are_paginated(monkeypatch):
+    monkeypatch.setattr(app, "artifact_store", None)
+    state = conversation(5)
+    turns, older = app.list_history_turns(state, limit=2)
+    assert [turn["prompt"] for turn in turns] == ["prompt 4", "prompt 3"]
+    turns, older = app.list_history_turns(state, before=older, limit=2)
+    assert [turn["prompt"] for turn in turns] == ["prompt 2", "prompt 1"]
+    turns, older = app.list_history_turns(state, before=older, limit=2)
+    assert [turn["prompt"] for turn in turns] == ["prompt 0"]
+    assert older is None
+
+
+def test_collapse_code_keeps_short_blocks():
+    short = "```html\n<p>hi</p>\n```"
+    assert app.collapse_code(short) == short
+    long = "```html\n" + "\n".join(f"<p>{i}</p>" for i in range(20)) + "\n```"
+    assert "12 more lines" in app.collapse_code(long, max_lines=8)
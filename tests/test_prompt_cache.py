@@ -0,0 +1,30 @@
+import app
+
+
+def test_prompt_tokens_drop_filler_words():
+    assert app.prompt_tokens("Create a purple TODO list app") == {"purple", "todo", "list"}
+
+
+def test_prompt_tokens_keep_negations():
+    with_mode = app.prompt_tokens("todo list with dark mode")
+    without_mode = app.prompt_tokens("todo list without dark mode")
+    assert with_mode != without_mode
+    assert "not" in app.prompt_tokens("a todo list that does not use dark mode")
+
+
+def test_prompt_index_finds_near_duplicates():
+    index = app.PromptIndex()
+    index.add(1, "purple todo list with dark mode", {"generation_id": 1})
+    index.add(2, "weather dashboard with charts", {"generation_id": 2})
+    match = index.query("a dark mode purple todo list with", threshold=0.6)
+    assert match["generation_id"] == 1
+    assert match["similarity"] == 1.0
+    assert index.query("snake game", threshold=0.6) is None
+
+
+def test_prompt_index_evicts_oldest():
+    index = app.PromptIndex(size=2)
+    for key, prompt in enumerate(["snake game", "tetris game", "chess board"], 1):
+        index.add(key, prompt, {"generation_id": key})
+    assert index.query("snake game", threshold=0.9) is None
+    assert index.query("chess board", threshold=0.9)["generation_id"] == 3
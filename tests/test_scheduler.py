@@ -0,0 +1,134 @@
+import app
+
+
+def test_newer_submit_supersedes_same_session():
+    scheduler = app.GenerationScheduler(slots=1)
+    first = scheduler.submit("session")
+    second = scheduler.submit("session")
+    assert first.superseded
+    assert not second.superseded
+
+
+def test_submit_without_supersede_keeps_earlier_tickets():
+    scheduler = app.GenerationScheduler(slots=1)
+    first = scheduler.submit("ip:10.0.0.1", supersede=False)
+    second = scheduler.submit("ip:10.0.0.1", supersede=False)
+    assert first.wait(0) and not first.superseded
+    assert not second.superseded and not second.granted.is_set()
+    scheduler.release(first)
+    assert second.wait(0)
+    scheduler.release(second)
+    assert scheduler.stats()["running"] == 0
+
+
+def test_one_key_cannot_hold_more_than_its_cap():
+    scheduler = app.GenerationScheduler(slots=4, session_limit=1)
+    noisy = [scheduler.submit("ip:1.2.3.4", supersede=False) for _ in range(10)]
+    other = scheduler.submit("session")
+    assert sum(ticket.granted.is_set() for ticket in noisy) == 1
+    assert other.granted.is_set()
+    assert not any(ticket.superseded for ticket in noisy)
+    assert scheduler.stats()["running"] == 2
+
+    scheduler.release(noisy[0])
+    assert noisy[1].granted.is_set()
+    assert sum(ticket.granted.is_set() for ticket in noisy[2:]) == 0
+
+
+def test_superseded_tickets_that_never_ran_are_refunded():
+    scheduler = app.GenerationScheduler(slots=1)
+    running = scheduler.submit("other")
+    clicks = [scheduler.submit("session") for _ in range(5)]
+    assert all(ticket.superseded for ticket in clicks[:-1])
+    assert scheduler.session_finish["session"] == clicks[-1].finish_tag == 4
+    newcomer = scheduler.submit("newcomer")
+    assert newcomer.finish_tag == clicks[-1].finish_tag
+    scheduler.release(running)
+    assert clicks[-1].granted.is_set()
+
+
+def test_sessions_are_served_fairly():
+    scheduler = app.GenerationScheduler(slots=1)
+    running = scheduler.submit("busy", supersede=False)
+    busy = [scheduler.submit("busy", supersede=False) for _ in range(3)]
+    other = scheduler.submit("other")
+    scheduler.release(running)
+    # the other session is dispatched before the busy session's backlog
+    assert other.granted.is_set()
+    assert not busy[0].granted.is_set()
+    scheduler.release(other)
+    assert busy[0].granted.is_set()
+
+
+def test_cached_tickets_do_not_take_a_slot():
+    scheduler = app.GenerationScheduler(slots=1)
+    running = scheduler.submit("a")
+    cached = scheduler.submit("b", "cached")
+    assert cached.wait(0)
+    assert scheduler.stats()["running"] == 1
+    scheduler.release(cached)
+    scheduler.release(running)
+    assert scheduler.stats()["running"] == 0
+
+
+def test_load_shedding_ladder(monkeypatch):
+    scheduler = app.GenerationScheduler(slots=2)
+    shedder = app.LoadShedder(scheduler)
+    monkeypatch.setattr(app, "prompt_index", None)
+
+    plan = shedder.plan("a pricing page", model=app.DEFAULT_MODEL, candidates=3)
+    assert (plan["level"], plan["model"], plan["candidates"]) == ("normal", app.DEFAULT_MODEL, 3)
+    assert plan["budget_scale"] == 1.0
+
+    tickets = [scheduler.submit(f"s{i}") for i in range(3)]
+    plan = shedder.plan("a pricing page", model=app.DEFAULT_MODEL, candidates=3)
+    assert plan["level"] == "low_budget"
+    assert (plan["model"], plan["candidates"]) == (app.SHED_FAST_MODEL, 1)
+    assert plan["model"] != app.DEFAULT_MODEL
+    assert plan["budget_scale"] == app.SHED_BUDGET_SCALE
+
+    tickets += [scheduler.submit(f"t{i}") for i in range(3)]
+    plan = shedder.plan("a pricing page")
+    assert plan["busy"] and plan["estimated_wait"] > 0
+    refine = shedder.plan("make it blue", artifact={"template": "html", "code": "<p>x</p>"})
+    assert not refine["busy"]
+
+    for ticket in tickets:
+        scheduler.release(ticket)
+    plan = shedder.plan("a pricing page")
+    assert (plan["level"], plan["budget_scale"]) == ("normal", 1.0)
+
+
+def test_shedding_does_not_touch_shared_budgets():
+    scheduler = app.GenerationScheduler(slots=1)
+    shedder = app.LoadShedder(scheduler)
+    before = app.completion_budget.estimate(app.DEFAULT_MODEL, "refine")
+    tickets = [scheduler.submit(f"s{i}") for i in range(3)]
+    assert shedder.plan("a pricing page")["budget_scale"] < 1.0
+    assert shedder.stats()["level"] != "normal"
+    assert app.completion_budget.estimate(app.DEFAULT_MODEL, "refine") == before
+    for ticket in tickets:
+        scheduler.release(ticket)
+
+
+def test_latency_spike_does_not_outlive_the_load():
+    scheduler = app.GenerationScheduler(slots=4)
+    shedder = app.LoadShedder(scheduler)
+    scheduler.latency, scheduler.latency_at = 95.0, app.time.time()
+    # nothing running: the old spike is ignored
+    assert shedder.level()[0] == 0
+
+    ticket = scheduler.submit("s")
+    assert app.SHED_LEVELS[shedder.level()[0]] == "cached"
+    # and it fades with age while requests are running
+    scheduler.latency_at -= 10 * app.SHED_LATENCY_HALF_LIFE
+    assert shedder.level()[0] == 0
+    scheduler.release(ticket)
+
+
+def test_several_candidates_skip_the_prompt_cache(monkeypatch):
+    shedder = app.LoadShedder(app.GenerationScheduler(slots=4))
+    monkeypatch.setattr(app, "find_reusable_artifact", lambda *args, **kwargs: {"serve": True})
+    assert shedder.plan("a pricing page", use_cache=True)["kind"] == "cached"
+    plan = shedder.plan("a pricing page", candidates=3, use_cache=True)
+    assert (plan["reuse"], plan["kind"]) == (None, "generate")
@@ -0,0 +1,70 @@
+import sqlite3
+
+from fastapi.testclient import TestClient
+
+import app
+
+
+def done_event(code, model=app.DEFAULT_MODEL):
+    response = f"```html\n{code}\n```"
+    return {"model": model, "finish_reason": "stop", "response": response, "duration": 1.5, "first_token": 0.2,
+            "usage": {"prompt_tokens": 10, "completion_tokens": 20}, "artifact": app.package_artifact(response)}
+
+
+def test_identical_outputs_share_blobs(tmp_path):
+    store = app.ArtifactStore(str(tmp_path))
+    first = store.record_generation("p", "s", "a page", done_event("<p>same</p>"))
+    second = store.record_generation("p", "s", "the page again", done_event("<p>same</p>"))
+    assert first != second
+
+    generations = store.list_generations("p")
+    assert len({generation["artifact_hash"] for generation in generations}) == 1
+    assert len({generation["response_blob"] for generation in generations}) == 1
+    # one response and one code blob
+    assert len([path for path in (tmp_path / "blobs").rglob("*") if path.is_file()]) == 2
+    assert store.get_artifact(generations[0]["artifact_hash"]) == {"template": "html", "code": "<p>same</p>"}
+
+
+def test_generations_are_keyset_paginated(tmp_path):
+    store = app.ArtifactStore(str(tmp_path))
+    ids = [store.record_generation("p", "s1" if i % 2 else "s2", f"prompt {i}", done_event(f"<p>{i}</p>"))
+           for i in range(5)]
+    store.record_generation("other", "s1", "elsewhere", done_event("<p>x</p>"))
+
+    page = store.list_generations("p", limit=2)
+    assert [generation["id"] for generation in page] == ids[:2:-1]
+    page = store.list_generations("p", limit=2, before_id=page[-1]["id"])
+    assert [generation["id"] for generation in page] == [ids[2], ids[1]]
+    assert [generation["id"] for generation in store.list_generations("p", before_id=ids[0])] == []
+
+    by_session = store.list_generations(session_id="s1")
+    assert [generation["prompt"] for generation in by_session] == ["elsewhere", "prompt 3", "prompt 1"]
+
+
+def test_store_adds_fresh_column_to_old_databases(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "store.db"))
+    conn.executescript(app.STORE_SCHEMA.replace("    fresh INTEGER NOT NULL DEFAULT 0,\n", ""))
+    conn.execute("INSERT INTO generations (project_id, model, prompt, response_blob, created_at) "
+                 "VALUES ('p', 'm', 'old prompt', 'x', 0)")
+    conn.commit()
+    conn.close()
+
+    store = app.ArtifactStore(str(tmp_path))
+    store.record_generation("p", None, "new prompt", done_event("<p>new</p>"), fresh=True)
+    assert [generation["fresh"] for generation in store.list_generations("p")] == [1, 0]
+    assert [generation["prompt"] for generation in store.list_fresh_generations(10)] == ["new prompt"]
+
+
+def test_blob_and_session_endpoints(tmp_path, monkeypatch):
+    store = app.ArtifactStore(str(tmp_path))
+    monkeypatch.setattr(app, "artifact_store", store)
+    store.record_generation("p", "s", "a page", done_event("<p>hi</p>"))
+    client = TestClient(app.api_app)
+
+    generations = client.get("/api/sessions/s/generations").json()["generations"]
+    assert len(generations) == 1
+    blob = client.get(f"/api/blobs/{generations[0]['response_blob']}")
+    assert blob.status_code == 200
+    assert blob.text == "```html\n<p>hi</p>\n```"
+    assert client.get("/api/blobs/" + "0" * 64).status_code == 404
+    assert client.get("/api/blobs/..%2Fstore.db").status_code == 404
@@ -0,0 +1,92 @@
+import pytest
+
+import app
+
+VALID_HTML = "```html\n<!DOCTYPE html>\n<html><head><title>Demo</title></head><body><p>Hi</p></body></html>\n```"
+
+
+def done_event(response):
+    return {
+        "type": "done",
+        "model": app.DEFAULT_MODEL,
+        "finish_reason": "stop",
+        "response": response,
+        "history": [{"role": "assistant", "content": response}],
+        "artifact": app.package_artifact(response),
+    }
+
+
+def test_valid_response_has_no_problems():
+    assert app.validate_response(VALID_HTML) == []
+
+
+def test_unbalanced_react_is_reported():
+    response = "```jsx\nexport default function App() {\n  return <div>{items.map(i => (<p>{i}</p>)}</div>;\n}\n```"
+    assert app.validate_response(response)
+
+
+def test_failed_repair_keeps_the_response(monkeypatch):
+    def request_repair(response, problems, model, budget_scale=1.0):
+        raise RuntimeError("rate limit exceeded")
+
+    monkeypatch.setattr(app, "request_repair", request_repair)
+    response = "```jsx\nexport default function App() {\n  return <div>;\n```"
+    *repairing, event = app.stream_repair(done_event(response))
+    assert [item["type"] for item in repairing] == ["repairing"]
+    assert event["problems"]
+    assert "model" not in event["repairs"]
+    assert "rate limit" in event["repair_error"]
+    assert event["artifact"]["code"]
+
+
+SVG = '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 10 10"><circle cx="5" cy="5" r="4"/></svg>'
+
+
+@pytest.mark.parametrize("response", [
+    f"Here is your drawing:\n\n```svg\n{SVG}\n```",
+    f"```xml\n{SVG}\n```",
+    f"Here is your drawing:\n\n{SVG}",
+])
+def test_svg_answers_are_renderable(response):
+    assert app.is_renderable(response)
+    assert app.validate_response(response) == []
+    artifact = app.package_artifact(response)
+    assert artifact["template"] == "html"
+    assert "<svg" in artifact["code"]
+
+
+def test_plain_text_is_not_renderable():
+    assert not app.is_renderable("Sure, what colours would you like?")
+
+
+def test_pipeline_validates_once_and_does_not_repair_prose(monkeypatch):
+    calls = []
+    validate_response = app.validate_response
+
+    def counting_validate(response):
+        calls.append(response)
+        return validate_response(response)
+
+    monkeypatch.setattr(app, "validate_response", counting_validate)
+    monkeypatch.setattr(app, "request_repair", lambda *args, **kwargs: pytest.fail("prose must not be repaired"))
+    prose = "Sure, what colours would you like?"
+    monkeypatch.setattr(app, "stream_candidates", lambda *args, **kwargs: iter([done_event(prose)]))
+
+    events = list(app.stream_pipeline("a page"))
+
+    assert [event["type"] for event in events] == ["done"]
+    assert events[-1]["problems"]
+    assert calls == [prose]
+
+
+def test_pipeline_announces_a_model_repair(monkeypatch):
+    broken = "```jsx\nexport default function App() {\n  return <div>{items.map(i => (<p>{i}</p>)}</div>;\n}\n```"
+    fixed = "```jsx\nexport default function App() {\n  return <div>{items.map(i => <p>{i}</p>)}</div>;\n}\n```"
+    monkeypatch.setattr(app, "request_repair", lambda *args, **kwargs: fixed)
+    monkeypatch.setattr(app, "stream_candidates", lambda *args, **kwargs: iter([done_event(broken)]))
+
+    events = list(app.stream_pipeline("a list"))
+
+    assert [event["type"] for event in events] == ["repairing", "done"]
+    assert events[-1]["repairs"] == ["model"]
+    assert events[-1]["response"] == fixed